@@ -40,7 +40,10 @@ PeRKy aide les utilisateurs à garder leur documentation à jour de leurs dével
 
 %install
 
-%{__install} -D -m 755 Src/prk.py                  %{buildroot}%{_bindir}/prk
+%{__install} -D -m 755 Src/prk.py                  %{buildroot}%{_datadir}/%{name}/prk.py
+%{__install} -D -m 644 Src/formatter.py            %{buildroot}%{_datadir}/%{name}/formatter.py
+%{__mkdir_p} %{buildroot}%{_bindir}
+ln -s %{_datadir}/%{name}/prk.py %{buildroot}%{_bindir}/prk
 
 %clean
 
@@ -50,6 +53,7 @@ rm -Rf $RPM_BUILD_ROOT
 
 %defattr( -, root, root )
 %{_bindir}/prk
+%{_datadir}/%{name}
 #%doc doc/*
 
 %changelog
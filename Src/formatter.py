@@ -32,86 +32,298 @@
 # The fact that you are presently reading this means that you have had
 # knowledge of the CeCILL license and that you accept its terms.
 
+"""Reformatting of text files, paragraph by paragraph
+
+Paragraphs are separated by blank lines. Each one is reflowed so that its
+lines are filled with as many words as possible, without exceeding a width.
+Indentation of its first line is kept, and lines following the first one of
+a list item ("- ") or of an enumeration item ("1. ") are aligned with its
+text.
+
+Usage: formatter.py [--width=N] [--jobs=N] [--check] FILE|DIRECTORY...
+
+Files of directories are searched recursively, except hidden ones. Only
+requirement storage files are reformatted: '.prk' files and files without
+extension, that hold plain text without any PeRKy delimiter. Files
+are only written if their content changes. With --check, files that need
+to be reformatted are listed instead, and exit status is 1 if there is any.
+"""
+
+import getopt
+import os
 import re
 import sys
 
-MAX_WIDTH = 78
-
-
-def redistribute(filename):
-    # Read file
-    content = list()
-    with open(filename, "rt") as flow:
-        for raw_line in flow:
-            content.append(raw_line.rstrip())
-
-    # Write file
-    with open(filename, "wt") as flow:
-        at_least_one_paragraph_output = False
-        lower = 0
-        upper = -1
-        while True:
-            # Isolate next paragraph boundaries
-            lower = upper + 1
-            while lower < len(content) and len(content[lower]) == 0:
-                lower += 1
-            if lower >= len(content):
-                break
-
-            upper = lower
-            while upper + 1 < len(content) and len(content[upper + 1]) != 0:
-                upper += 1
-
-            # Assemble paragraph into a single string
-            paragraph = " ".join(content[lower:upper + 1])
-
-            # Determine indentation
-            for padding in range(len(paragraph)):
-                if paragraph[padding] != " ":
-                    break
-            prefix = " " * padding
-
-            # Remove superfluous spaces
-            paragraph = paragraph.strip()
-            paragraph = re.sub(r"\s+", " ", paragraph)
-
-            # Output paragraph
-            if at_least_one_paragraph_output:
-                flow.write("\n")
-
-            first_line_has_been_output = False
-            while len(paragraph) > 0:
-                if len(paragraph) <= MAX_WIDTH + 1 - padding:
-                    i = len(paragraph) + 1
-                else:
-                    for i in range(MAX_WIDTH + 1 - padding, 0, -1):
-                        if paragraph[i] == " ":
-                            break
-                    else:
-                        for i in range(MAX_WIDTH + 2 - padding,
-                                       len(paragraph)):
-                            if paragraph[i] == " ":
-                                break
-                flow.write(prefix + paragraph[:i] + "\n")
-
-                # Update indentation if necessary
-                if not first_line_has_been_output:
-                    if paragraph.startswith("- "):
-                        padding += 2
-                        prefix = " " * padding
-                    match = re.match(r"(\d+. )", paragraph)
-                    if match:
-                        padding += len(match.groups(1)[0])
-                        prefix = " " * padding
-                first_line_has_been_output = True
-
-                # Next line
-                paragraph = paragraph[i + 1:]
-
-            # Next paragraph
-            at_least_one_paragraph_output = True
+# Maximum number of columns of a reflowed line
+MAX_WIDTH = 79
+
+# Names of requirement storage files, found in directories: inline
+# requirements, and fields of requirements stored as directories
+STORAGE_FILE_REGEX = re.compile(r"^[_0-9A-Za-z-]+(\.prk)?$")
+
+# PeRKy delimiters, whose lines shall never be reflowed
+DELIMITER_REGEX = re.compile(r"^(-- )?PRK-[A-Z]+\b", re.MULTILINE)
+
+
+def iterate_paragraphs(lines):
+    """Paragraphs of text, as lists of their lines without trailing spaces
+    """
+    paragraph = list()
+    for line in lines:
+        line = line.rstrip()
+        if len(line) > 0:
+            paragraph.append(line)
+        elif len(paragraph) > 0:
+            yield paragraph
+            paragraph = list()
+
+    if len(paragraph) > 0:
+        yield paragraph
+
+
+def reflow_paragraph(lines, width=MAX_WIDTH):
+    """Lines of a paragraph, reflowed on width columns
+
+    Spaces are collapsed, and words are dealt out to lines in a single pass.
+    A word too long for a line is output alone on it, unbroken
+    """
+    padding = len(lines[0]) - len(lines[0].lstrip(" "))
+    words = [word for line in lines for word in line.split()]
+
+    result = list()
+    line = list()
+    length = -1
+    for word in words:
+        if len(line) > 0 and length + 1 + len(word) > width - padding:
+            result.append(" " * padding + " ".join(line))
+            line = list()
+            length = -1
+
+            # Next lines of an item are aligned with its text
+            if len(result) == 1:
+                padding += _item_padding(words)
+
+        line.append(word)
+        length += 1 + len(word)
+    result.append(" " * padding + " ".join(line))
+
+    return result
+
+
+def _item_padding(words):
+    """Additional indentation of the lines following the first one of a
+    paragraph, given as its words
+    """
+    result = 0
+
+    beginning = " ".join(words[:2])
+    if beginning.startswith("- "):
+        result += 2
+    match = re.match(r"(\d+. )", beginning)
+    if match:
+        result += len(match.group(1))
+
+    return result
+
+
+def iterate_reflowed_lines(lines, width=MAX_WIDTH):
+    """Lines of text, reflowed paragraph by paragraph on width columns.
+    Paragraphs are separated by a single blank line
+    """
+    first_paragraph = True
+    for paragraph in iterate_paragraphs(lines):
+        if not first_paragraph:
+            yield ""
+        yield from reflow_paragraph(paragraph, width)
+        first_paragraph = False
+
+
+def reflow(text, width=MAX_WIDTH):
+    """Text reflowed on width columns. Text is given either as a string, or
+    as an iterable of lines (like a file). Each output line ends with a
+    newline
+    """
+    if isinstance(text, str):
+        text = _iterate_lines(text)
+
+    return "".join(line + "\n" for line in iterate_reflowed_lines(text,
+                                                                  width))
+
+
+def _iterate_lines(text):
+    """Lines of a string without their newline, as str.split("\n") would
+    return them, without copying them all at once
+    """
+    start = 0
+    end = text.find("\n")
+    while end >= 0:
+        yield text[start:end]
+        start = end + 1
+        end = text.find("\n", start)
+    yield text[start:]
+
+
+def _iterate_chunks(original, width=MAX_WIDTH):
+    """Content of a reflowed file, given its original content, line by line.
+    A file without final newline is left without one
+    """
+    previous = None
+    for line in iterate_reflowed_lines(_iterate_lines(original), width):
+        if previous is not None:
+            yield previous + "\n"
+        previous = line
+
+    if previous is not None:
+        yield previous + ("\n" if original.endswith("\n") else "")
+
+
+def redistribute(filename, width=MAX_WIDTH, check=False, plain_only=False):
+    """Reflow a text file in place, unless check is True
+
+    A file without final newline is left without one. File is only written
+    if its content changes. It is then replaced
+    atomically, so that readers never get a partially written file. If
+    plain_only is True, a file that is not text, or that holds PeRKy
+    delimiters, is left untouched. Returns True if file content is changed
+    (or would be, if check is True)
+    """
+    try:
+        with open(filename, "rt") as flow:
+            original = flow.read()
+    except UnicodeDecodeError:
+        if plain_only:
+            return False
+        raise
+    if plain_only and ("\0" in original or DELIMITER_REGEX.search(original)):
+        return False
+
+    # Content is compared as it is reflowed, and only written if it
+    # changes, by reflowing it again: a file is never held twice in memory
+    position = 0
+    for chunk in _iterate_chunks(original, width):
+        if not original.startswith(chunk, position):
+            break
+        position += len(chunk)
+    else:
+        if position == len(original):
+            return False
+    if check:
+        return True
+
+    temporary_path = os.path.join(
+        os.path.dirname(filename), ".{}.{}.tmp".format(
+            os.path.basename(filename), os.getpid()))
+    try:
+        with open(temporary_path, "wt") as flow:
+            flow.writelines(_iterate_chunks(original, width))
+        os.chmod(temporary_path, os.stat(filename).st_mode)
+        os.replace(temporary_path, filename)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    return True
+
+
+def iterate_files(paths):
+    """Files given by paths, those of directories being searched recursively
+    (except hidden ones), as (filename, plain_only) pairs
+
+    Only requirement storage files are searched for in directories, and
+    plain_only is then True (see redistribute)
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, False
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for f in sorted(files):
+                if STORAGE_FILE_REGEX.match(f):
+                    yield os.path.join(root, f), True
+
+
+def _redistribute_safely(filename, width, check, plain_only):
+    """redistribute() result, or error message, as a (changed, error) pair
+    """
+    try:
+        return redistribute(filename, width, check, plain_only), None
+    except (OSError, UnicodeDecodeError) as e:
+        return False, "{}: {}".format(filename, e)
+
+
+def redistribute_all(paths, width=MAX_WIDTH, check=False, jobs=None):
+    """Reflow files given by paths (see iterate_files) on a pool of jobs
+    processes (as many as processors by default)
+
+    Returns the list of files that have changed (or would, if check is
+    True) and the list of error messages
+    """
+    files = list(iterate_files(paths))
+    filenames = [filename for filename, _ in files]
+    plain_only = [is_plain_only for _, is_plain_only in files]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1 or len(filenames) <= 1:
+        results = map(_redistribute_safely, filenames,
+                      [width] * len(filenames), [check] * len(filenames),
+                      plain_only)
+        executor = None
+    else:
+        # A pool is only needed to reflow several files
+        import concurrent.futures
+
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(
+            _redistribute_safely, filenames, [width] * len(filenames),
+            [check] * len(filenames), plain_only,
+            chunksize=max(1, len(filenames) // (4 * jobs)))
+
+    changed = list()
+    errors = list()
+    try:
+        for filename, (is_changed, error) in zip(filenames, results):
+            if is_changed:
+                changed.append(filename)
+            if error is not None:
+                errors.append(error)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return changed, errors
 
 
 if __name__ == "__main__":
-    for filename in sys.argv[1:]:
-        redistribute(filename)
+    width = MAX_WIDTH
+    jobs = None
+    check = False
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "j:w:",
+                                   ["check", "jobs=", "width="])
+        for opt, val in opts:
+            if opt == "--check":
+                check = True
+            elif opt in ["-j", "--jobs"]:
+                jobs = max(1, int(val))
+            elif opt in ["-w", "--width"]:
+                width = int(val)
+    except (getopt.GetoptError, ValueError) as e:
+        print(e, file=sys.stderr)
+        print(__doc__.split("\n\n")[-2], file=sys.stderr)
+        sys.exit(2)
+
+    changed, errors = redistribute_all(args, width, check, jobs)
+    for error in errors:
+        print(error, file=sys.stderr)
+    if check:
+        for filename in changed:
+            print(filename)
+
+    if len(errors) > 0:
+        sys.exit(2)
+    elif check and len(changed) > 0:
+        sys.exit(1)
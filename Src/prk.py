@@ -42,14 +42,37 @@ go from one view to another, and thus edit efficiently a requirements
 documentation.
 """
 
+import array
+import bisect
 import collections
 import configparser
+import cProfile
+import filecmp
+import functools
 import getopt
+import gzip
 import hashlib
+import importlib.util
+import io
+import itertools
+import locale
 import logging
+import lzma
+import marshal
+import mmap
+import operator
 import os
+import pickle
 import re
+import shutil
+import signal
+import string
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
 
 # Tags associated to PeRKy delimiters
 TAG_BRB = "PRK-REQ"
@@ -66,9 +89,17 @@ TAG_RTM = "PRK-XTM"
 TAG_TOC = "PRK-TOC"
 TAG_TRB = "PRK-REF"
 
+# Kinds of tokens that are not PeRKy delimiters
+TOKEN_HDG = "heading"
+TOKEN_TXT = "text"
+
 # Configurable input/output features
 IDENTIFIER_REGEX = "^[_0-9A-Za-z-]+$"
 
+# Reflow of requirements, installed along this script
+FORMATTER_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                              "formatter.py")
+
 PUBLISH_FORMAT = """.. _{req_id}:
 
 **[{req_id}]**
@@ -85,6 +116,9 @@ PUBLISH_FORMAT = """.. _{req_id}:
 
 class IdFactory(object):
     """Generator of identifiers for requirement blocks
+
+    It is also the registry of already reserved identifiers, that remembers
+    where each of them has been reserved first
     """
 
     # minimum length of the numerical part
@@ -93,13 +127,73 @@ class IdFactory(object):
     # format string used to generate new identifiers
     _FORMAT = "REQ-{}"
 
+    # ratio of used identifiers from which a length of numerical part is
+    # considered full, and skipped by generation
+    _SATURATION = 0.9
+
     def __init__(self):
         self._reserved_ids = set()
 
-    def add(self, req_id):
+        # (origin, line number) of reservation, by identifier
+        self._origins = dict()
+
+        # reserved identifiers, in order. Built on demand only
+        self._sorted_ids = None
+
+        # number of reserved identifiers that could have been generated, by
+        # length of their numerical part
+        self._used_slots = collections.Counter()
+        self._parse_format()
+
+    def add(self, req_id, origin=None, line_num=None):
         """Add requirement identifier to the list of the already reserved ones
+
+        origin is the delimiter by which identifier is reserved, if any, and
+        line_num the number of the line it has been found on
+        """
+        if req_id not in self._reserved_ids:
+            self._reserved_ids.add(req_id)
+            self._origins[req_id] = (origin, line_num)
+            self._sorted_ids = None
+            self._count_slot(req_id)
+
+    def update(self, req_ids, origin=None):
+        """Add several requirement identifiers at once
+        """
+        for req_id in req_ids:
+            self.add(req_id, origin)
+
+    def origin(self, req_id):
+        """(origin, line number) of the first reservation of an identifier
+        """
+        return self._origins[req_id]
+
+    def range(self, lower=None, upper=None):
+        """Iterates in order over reserved identifiers from lower (included)
+        to upper (excluded)
+        """
+        sorted_ids = self._get_sorted_ids()
+
+        start = 0
+        if lower is not None:
+            start = bisect.bisect_left(sorted_ids, lower)
+        stop = len(sorted_ids)
+        if upper is not None:
+            stop = bisect.bisect_left(sorted_ids, upper)
+
+        for i in range(start, stop):
+            yield sorted_ids[i]
+
+    def with_prefix(self, prefix):
+        """Iterates in order over reserved identifiers starting with prefix
         """
-        self._reserved_ids.add(req_id)
+        sorted_ids = self._get_sorted_ids()
+
+        for i in range(bisect.bisect_left(sorted_ids, prefix),
+                       len(sorted_ids)):
+            if not sorted_ids[i].startswith(prefix):
+                break
+            yield sorted_ids[i]
 
     def configure(self, pattern="REQ-%N", width=4):
         """Change pattern used for next generations
@@ -111,14 +205,14 @@ class IdFactory(object):
         if int(width) > 0:
             self._N = int(width)
 
-        valid_format = False
+        marks = 0
         escape_mark = False
         proposed_format = ""
         for c in pattern:
             if escape_mark:
                 if c == "N":
                     proposed_format += "{0:}"
-                    valid_format = True
+                    marks += 1
                 else:
                     proposed_format += c
                 escape_mark = False
@@ -127,16 +221,26 @@ class IdFactory(object):
             else:
                 proposed_format += c
 
-        if not valid_format:
+        if marks == 0:
             logging.error(
                 "Pattern '{}' does not contain any valid '%N' mark".format(
                     pattern))
+        elif marks > 1:
+            logging.error(
+                "Pattern '{}' contains more than one '%N' mark".format(
+                    pattern))
         else:
             if escape_mark:
                 logging.warning(
                     "Pattern '{}' ends with extraneous %".format(pattern))
             self._FORMAT = proposed_format
 
+        # Slots are relative to pattern and width
+        self._parse_format()
+        self._used_slots.clear()
+        for req_id in self._reserved_ids:
+            self._count_slot(req_id)
+
     def generate(self, content):
         """Generate a new requirement identifier from its content
         """
@@ -150,33 +254,90 @@ class IdFactory(object):
         self.add(result)
         return result
 
+    def __contains__(self, req_id):
+        return req_id in self._reserved_ids
+
     def __iter__(self):
         """Iterates over the set of already reserved ids
         """
         for req_id in self._reserved_ids:
             yield req_id
 
-    def _hash_value(self, string):
+    def __len__(self):
+        return len(self._reserved_ids)
+
+    def __getstate__(self):
+        # Plain data only, that marshal can store (see PreprocessCache)
+        return (self._N, self._FORMAT, self._origins,
+                dict(self._used_slots))
+
+    def __setstate__(self, state):
+        self._N, self._FORMAT, self._origins, used_slots = state
+        self._reserved_ids = set(self._origins)
+        self._sorted_ids = None
+        self._used_slots = collections.Counter(used_slots)
+        self._parse_format()
+
+    def _get_sorted_ids(self):
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self._reserved_ids)
+        return self._sorted_ids
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _hash_value(string):
         """Hash string with MD5 algorithm
         """
         result = None
 
-        hash_as_string_b16 = hashlib.md5(string.encode("utf-8")).hexdigest()
-        hash_as_string_b10 = str(int(hash_as_string_b16, 16))
+        digest = hashlib.md5(string.encode("utf-8")).digest()
+        hash_as_string_b10 = str(int.from_bytes(digest, "big"))
 
         # Revert it to equilibrate distribution of values
         result = hash_as_string_b10[::-1]
 
         return result
 
+    def _parse_format(self):
+        self._prefix, self._suffix = self._FORMAT.format("\0").split("\0")
+
+    def _count_slot(self, req_id):
+        """Count reserved identifier in the slots of generable ones, if it
+        matches current format
+        """
+        prefix_length = len(self._prefix)
+        suffix_length = len(self._suffix)
+
+        if len(req_id) > prefix_length + suffix_length \
+           and req_id.startswith(self._prefix) \
+           and req_id.endswith(self._suffix):
+            extract = req_id[prefix_length:len(req_id) - suffix_length]
+            if extract.isdigit() and extract.isascii():
+                length = len(extract)
+                if length == self._N or (length > self._N
+                                         and extract[0] != "0"):
+                    self._used_slots[length] += 1
+
+    def _capacity(self, length):
+        """Number of identifiers that can be generated with a numerical part
+        of given length
+        """
+        if length == self._N:
+            return 10**length
+        else:
+            return 9 * 10**(length - 1)
+
     def _extract_new_id(self, footprint):
         """Generate shortest available requirement id from an hash value
         """
         result = None
 
+        prefix = self._prefix
+        suffix = self._suffix
+        reserved_ids = self._reserved_ids
         for extract in self._iter_footprint(footprint):
-            result = self._FORMAT.format(extract)
-            if result not in self._reserved_ids:
+            result = prefix + extract + suffix
+            if result not in reserved_ids:
                 break
         else:
             result = None
@@ -189,77 +350,813 @@ class IdFactory(object):
         return result
 
     def _iter_footprint(self, footprint):
+        # Lengths whose identifiers are nearly all used are skipped, as
+        # looking for a free one would mostly result in collisions
+        shortest = self._N
+        while self._used_slots[shortest] >= \
+                self._SATURATION * self._capacity(shortest):
+            shortest += 1
+
         # First try: search for an identifier of exactly N characters. In this
         # case, it can start by any number of '0' characters
-        for offset in range(len(footprint) - self._N + 1):
-            yield footprint[offset:offset + self._N]
+        if shortest == self._N:
+            for offset in range(len(footprint) - self._N + 1):
+                yield footprint[offset:offset + self._N]
+            shortest += 1
 
         # Second try: search for shortest identifier possible. In this case,
         # it cannot start by a '0' character
-        for length in range(self._N + 1, len(footprint) + 1):
+        for length in range(shortest, len(footprint) + 1):
             for offset in range(len(footprint) - length + 1):
                 if footprint[offset] != '0':
                     yield footprint[offset:offset + length]
 
 
-def preprocess(lines):
-    """First pass to analyze various points from document stored line by line:
-    - load traceability (if any) from TAG_LNK marks
+class TraceabilityGraph(object):
+    """Traceability links from requirements to the identifiers they reference
+
+    Identifiers are interned as integers, indexed in sorted order. Links are
+    gathered as pairs of identifiers, and stored once they are queried in
+    compressed sparse row form: for each identifier, the range of its
+    neighbours in an array of integers. Backward form is only built from
+    forward one if it is queried as well. A requirement that is derived from
+    no reference is flagged as such.
+
+    Unless lines is False, the line number where each identifier and each
+    link first appear is kept as well, 0 standing for an unknown line.
+    """
+
+    # Flags of an identifier
+    _REQUIREMENT = 1
+    _DERIVED = 2
+    _REFERENCE = 4
+
+    def __init__(self, lines=True):
+        self._ids = list()
+        self._indices = dict()
+        self._flags = array.array("B")
+        self._lines = array.array("I")
+        self._lines_kept = lines
+
+        # Links not stored in compressed form yet, as their requirement and
+        # reference identifiers, and their line numbers
+        self._sources = list()
+        self._targets = list()
+        self._pending_lines = array.array("I")
+
+        # Numbers of identifiers and of pending links, when identifiers have
+        # been indexed for the last time
+        self._indexed = (0, 0)
+
+        # (offsets, neighbours) arrays, from requirements to references and
+        # backwards, or None until they are queried. Line numbers of links
+        # are in the order of forward neighbours
+        self._forward = None
+        self._backward = None
+        self._link_lines = array.array("I")
+
+        # Indices of identifiers linked in a cycle, by group. Built on demand
+        self._cycles = None
+
+        # Indices of the identifiers reachable from an identifier, by
+        # direction of links and index of the latter. Built on demand
+        self._reachable = dict()
+
+    def __eq__(self, other):
+        if not isinstance(other, TraceabilityGraph):
+            return NotImplemented
+
+        # Line numbers are not compared
+        return self._compressed(forward=True) == \
+            other._compressed(forward=True) and self._ids == other._ids \
+            and self._flags == other._flags
+
+    def __contains__(self, req_id):
+        self._index()
+        index = self._indices.get(req_id)
+        return index is not None and self._flags[index] & self._REQUIREMENT
+
+    def __getstate__(self):
+        # Plain data only, that marshal can store (see PreprocessCache).
+        # Interning table and backward arrays are rebuilt when needed
+        offsets, neighbours = self._compressed(forward=True)
+        return (self._ids, self._flags.tobytes(), self._lines.tobytes(),
+                self._lines_kept, offsets.tobytes(), neighbours.tobytes(),
+                self._link_lines.tobytes(), self._cycles)
+
+    def __setstate__(self, state):
+        ids, flags, lines, lines_kept, offsets, neighbours, link_lines, \
+            cycles = state
+
+        self.__init__(lines_kept)
+        self._ids = ids
+        self._indices = dict(zip(ids, range(len(ids))))
+        self._flags = array.array("B", flags)
+        self._lines = array.array("I", lines)
+        self._indexed = (len(ids), 0)
+        self._forward = (array.array("I", offsets),
+                         array.array("I", neighbours))
+        self._link_lines = array.array("I", link_lines)
+        self._cycles = cycles
+
+    def add_requirement(self, req_id, line_num=None):
+        """Declare a requirement, even if it has no link
+        """
+        self._intern(req_id, self._REQUIREMENT, line_num)
+
+    def add_link(self, req_id, ref_id, line_num=None):
+        # Identifiers are only interned as integers when they are indexed
+        self._sources.append(sys.intern(req_id))
+        self._targets.append(sys.intern(ref_id))
+        if self._lines_kept:
+            self._pending_lines.append(line_num or 0)
+
+    def set_derived(self, req_id, line_num=None):
+        self._intern(req_id, self._REQUIREMENT | self._DERIVED, line_num)
+
+    def line(self, identifier):
+        """Line number where identifier first appears, if known
+        """
+        self._index()
+        index = self._indices.get(identifier)
+        if index is None or self._lines[index] == 0:
+            return None
+        return self._lines[index]
+
+    def link_line(self, req_id, ref_id):
+        """Line number where a link first appears, if known
+        """
+        if not self._lines_kept:
+            return None
+
+        offsets, neighbours = self._compressed(forward=True)
+        source = self._indices.get(req_id)
+        target = self._indices.get(ref_id)
+        if source is None or target is None:
+            return None
+
+        i = bisect.bisect_left(neighbours, target, offsets[source],
+                               offsets[source + 1])
+        if i == offsets[source + 1] or neighbours[i] != target \
+           or self._link_lines[i] == 0:
+            return None
+        return self._link_lines[i]
+
+    def restricted(self, req_ids):
+        """Graph of the given requirements only, with their links
+        """
+        result = TraceabilityGraph(self._lines_kept)
+        for req_id in req_ids:
+            if req_id not in self:
+                continue
+
+            if self.is_derived(req_id):
+                result.set_derived(req_id, self.line(req_id))
+            else:
+                result.add_requirement(req_id, self.line(req_id))
+            for ref_id in self.references(req_id):
+                result.add_link(req_id, ref_id,
+                                self.link_line(req_id, ref_id))
+
+        return result
+
+    def is_derived(self, req_id):
+        index = self._indices.get(req_id)
+        return index is not None and bool(self._flags[index] & self._DERIVED)
+
+    def requirements(self):
+        """Identifiers of requirements, in order
+        """
+        return self._select(self._REQUIREMENT)
+
+    def referenced_ids(self):
+        """Identifiers referenced by at least one requirement, in order
+        """
+        return self._select(self._REFERENCE)
+
+    def references(self, req_id):
+        """Identifiers referenced by a requirement, in order
+        """
+        return self._neighbours(req_id, forward=True)
+
+    def referrers(self, ref_id):
+        """Identifiers of the requirements that reference ref_id, in order
+        """
+        return self._neighbours(ref_id, forward=False)
+
+    def rows(self, forward=True):
+        """Pairs of each requirement and the identifiers it references, in
+        order, or of each referenced identifier and the requirements that
+        reference it if forward is False
+        """
+        offsets, neighbours = self._compressed(forward)
+        if forward:
+            flag = self._REQUIREMENT
+        else:
+            flag = self._REFERENCE
+
+        ids = self._ids
+        flags = self._flags
+        for index, identifier in enumerate(ids):
+            if flags[index] & flag:
+                yield identifier, [
+                    ids[i]
+                    for i in neighbours[offsets[index]:offsets[index + 1]]]
+
+    def reachable(self, identifiers, forward=True):
+        """Identifiers reachable from given ones through links, at any depth,
+        in order
+
+        Links are followed from requirements to references if forward is
+        True, the other way round otherwise. Given identifiers are not part of
+        the result
+        """
+        self._compressed(forward)
+
+        starts = [self._indices[identifier] for identifier in identifiers
+                  if identifier in self._indices]
+        reached = set()
+        for index in starts:
+            reached.update(self._reachable_from(index, forward))
+        reached.difference_update(starts)
+
+        ids = self._ids
+        return [ids[index] for index in sorted(reached)]
+
+    def cycles(self):
+        """Groups of identifiers linked in a cycle, in order
+        """
+        self.index()
+
+        return sorted([self._ids[index] for index in sorted(indices)]
+                      for indices in self._cycles)
+
+    def index(self):
+        """Find cycles of the graph, as its strongly connected components
+        with more than one identifier or linked to themselves, if not done
+        yet
+
+        They are kept with the graph, and thus by PreprocessCache. Returns
+        True if they had to be searched for
+        """
+        offsets, neighbours = self._compressed(forward=True)
+        if self._cycles is not None:
+            return False
+
+        # Iterative version of Tarjan's algorithm
+        count = len(self._ids)
+        order = array.array("l", [-1]) * count
+        lowest = array.array("l", [0]) * count
+        stack = list()
+        on_stack = bytearray(count)
+        visited = 0
+        cycles = list()
+
+        for root in range(count):
+            if order[root] >= 0:
+                continue
+
+            order[root] = lowest[root] = visited
+            visited += 1
+            stack.append(root)
+            on_stack[root] = 1
+            path = [(root, offsets[root])]
+
+            while len(path) > 0:
+                node, i = path[-1]
+                if i < offsets[node + 1]:
+                    path[-1] = (node, i + 1)
+                    child = neighbours[i]
+                    if order[child] < 0:
+                        order[child] = lowest[child] = visited
+                        visited += 1
+                        stack.append(child)
+                        on_stack[child] = 1
+                        path.append((child, offsets[child]))
+                    elif on_stack[child] and order[child] < lowest[node]:
+                        lowest[node] = order[child]
+                    continue
+
+                path.pop()
+                if len(path) > 0 and lowest[node] < lowest[path[-1][0]]:
+                    lowest[path[-1][0]] = lowest[node]
+
+                if lowest[node] == order[node]:
+                    members = list()
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        members.append(member)
+                        if member == node:
+                            break
+                    if len(members) > 1 or node in \
+                            neighbours[offsets[node]:offsets[node + 1]]:
+                        cycles.append(members)
+
+        self._cycles = cycles
+
+        return True
+
+    def _intern(self, identifier, flag, line_num):
+        if not self._lines_kept:
+            line_num = None
+
+        index = self._indices.get(identifier)
+        if index is None:
+            index = len(self._ids)
+            self._indices[identifier] = index
+            self._ids.append(identifier)
+            self._flags.append(flag)
+            self._lines.append(line_num or 0)
+        else:
+            self._flags[index] |= flag
+            if self._lines[index] == 0 and line_num:
+                self._lines[index] = line_num
+
+        return index
+
+    def _reachable_from(self, index, forward):
+        """Indices of the identifiers reachable from an identifier, given by
+        its index. They are kept until graph changes
+        """
+        result = self._reachable.get((forward, index))
+        if result is not None:
+            return result
+
+        offsets, neighbours = self._compressed(forward)
+        result = set()
+        pending = [index]
+        while len(pending) > 0:
+            node = pending.pop()
+            for neighbour in neighbours[offsets[node]:offsets[node + 1]]:
+                if neighbour in result:
+                    continue
+
+                # Identifiers already known to be reachable from neighbour
+                # need not be visited again
+                result.add(neighbour)
+                known = self._reachable.get((forward, neighbour))
+                if known is None:
+                    pending.append(neighbour)
+                else:
+                    result.update(known)
+
+        result = frozenset(result)
+        self._reachable[(forward, index)] = result
+
+        return result
+
+    def _select(self, flag):
+        self._index()
+        flags = self._flags
+        return [identifier for index, identifier in enumerate(self._ids)
+                if flags[index] & flag]
+
+    def _neighbours(self, identifier, forward):
+        offsets, neighbours = self._compressed(forward)
+        index = self._indices.get(identifier)
+        if index is None:
+            return list()
+
+        ids = self._ids
+        return [ids[i] for i in neighbours[offsets[index]:offsets[index + 1]]]
+
+    def _index(self):
+        """Index identifiers in sorted order, with the flags and lines they
+        get from pending links, unless it is already done
+        """
+        if self._indexed == (len(self._ids), len(self._sources)):
+            return
+
+        # Compressed links are renumbered by compressing them again
+        if self._forward is not None:
+            self._uncompress()
+
+        sources = set(self._sources)
+        targets = set(self._targets)
+        ids = sorted(sources.union(targets, self._ids))
+        count = len(ids)
+        indices = dict(zip(ids, range(count)))
+        flags = array.array("B", bytes(count))
+        lines = array.array("I", [0]) * count
+        new_indices = list(map(indices.__getitem__, self._ids))
+        for index, flag in zip(new_indices, self._flags):
+            flags[index] = flag
+        if self._lines_kept:
+            for index, line in zip(new_indices, self._lines):
+                lines[index] = line
+
+        for index in map(indices.__getitem__, sources):
+            flags[index] |= self._REQUIREMENT
+        for index in map(indices.__getitem__, targets):
+            flags[index] |= self._REFERENCE
+        for ends in [self._sources, self._targets]:
+            if not self._lines_kept:
+                break
+
+            # Pending links are visited backwards, so that the line of the
+            # first one of each identifier remains
+            for identifier, line in dict(zip(
+                    reversed(ends), reversed(self._pending_lines))).items():
+                index = indices[identifier]
+                if line != 0 and (lines[index] == 0 or line < lines[index]):
+                    lines[index] = line
+
+        self._ids = ids
+        self._indices = indices
+        self._flags = flags
+        self._lines = lines
+        self._indexed = (count, len(self._sources))
+        self._cycles = None
+        self._reachable = dict()
+
+    def _compressed(self, forward):
+        """(offsets, neighbours) arrays of links in the given direction
+        """
+        self._index()
+        if self._forward is None:
+            self._compress()
+        if forward:
+            return self._forward
+
+        if self._backward is None:
+            # Sources are gathered by target in order, which keeps them
+            # sorted for each target
+            count = len(self._ids)
+            forward_offsets, targets = self._forward
+            rows = [list() for target in range(count)]
+            for source in range(count):
+                for target in targets[forward_offsets[source]:
+                                      forward_offsets[source + 1]]:
+                    rows[target].append(source)
+            offsets = array.array("I", itertools.accumulate(map(len, rows),
+                                                            initial=0))
+            neighbours = array.array("I")
+            for row in rows:
+                neighbours.extend(row)
+            self._backward = (offsets, neighbours)
+
+        return self._backward
+
+    def _compress(self):
+        """Store pending links in compressed form, row by row
+        """
+        indices = self._indices
+        count = len(self._ids)
+        if self._lines_kept:
+            lines = self._pending_lines
+        else:
+            lines = itertools.repeat(0)
+
+        # First line of each link, by target, for each source. A link at an
+        # unknown line only counts if its line remains unknown
+        rows = [dict() for source in range(count)]
+        for source, target, line in zip(self._sources, self._targets, lines):
+            row = rows[indices[source]]
+            target = indices[target]
+            first_line = row.get(target)
+            if first_line is None or (line != 0 and
+                                      (first_line == 0 or line < first_line)):
+                row[target] = line
+
+        offsets = array.array("I", itertools.accumulate(map(len, rows),
+                                                        initial=0))
+        neighbours = array.array("I")
+        link_lines = array.array("I")
+        for row in rows:
+            if len(row) == 0:
+                continue
+            targets = sorted(row)
+            neighbours.extend(targets)
+            if self._lines_kept:
+                link_lines.extend(row[target] for target in targets)
+
+        self._forward = (offsets, neighbours)
+        if self._lines_kept:
+            self._link_lines = link_lines
+        self._backward = None
+
+        self._sources = list()
+        self._targets = list()
+        self._pending_lines = array.array("I")
+        self._indexed = (count, 0)
+
+    def _uncompress(self):
+        """Move compressed links back to pending ones
+        """
+        offsets, neighbours = self._forward
+        for source, identifier in enumerate(self._ids[:len(offsets) - 1]):
+            for i in range(offsets[source], offsets[source + 1]):
+                self._sources.append(identifier)
+                self._targets.append(self._ids[neighbours[i]])
+                if self._lines_kept:
+                    self._pending_lines.append(self._link_lines[i])
+
+        self._forward = None
+        self._backward = None
+        self._link_lines = array.array("I")
+
+
+Token = collections.namedtuple("Token", ["kind", "line_num", "line", "value"])
+Token.__doc__ = """Lexical unit of a document, one per line
+
+kind is either one of the TAG_* delimiters, TOKEN_HDG or TOKEN_TXT. value is
+what remains of the line after the delimiter, or (code, title) for reST
+heading underlines
+"""
+
+# All PeRKy delimiters, recognized by looking up the beginning of a line.
+# Opening delimiters are all as long as TAG_LNK, and ending ones as TAG_ERB
+_TAGS = frozenset([
+    TAG_BRB, TAG_BTB, TAG_DLN, TAG_DRM, TAG_DTM, TAG_ERB, TAG_ETB, TAG_IPR,
+    TAG_LNK, TAG_RRI, TAG_RTM, TAG_TOC, TAG_TRB
+])
+
+# Underline of a reST section title
+_UNDERLINE_REGEX = re.compile(r"([{}])\1{{3}}".format(
+    re.escape(string.punctuation)))
+
+# Characters an underline may be made of, to only match lines starting with
+# one of them against _UNDERLINE_REGEX
+_UNDERLINE_CHARACTERS = frozenset(string.punctuation)
+
+# Parameters of a TAG_BTB delimiter
+_FIELD_REGEX = re.compile(r"\s+(\S+)\s*(.*)")
+
+
+def tokenize(lines):
+    """Lexical analysis of a document, iterated line by line
+
+    Lines are right-stripped before being tokenized. A TOKEN_HDG token is
+    produced for the underline of a reST section title, whose text is the
+    previous line
+    """
+    tags = _TAGS
+    opening = len(TAG_LNK)
+    ending = len(TAG_ERB)
+    match_underline = _UNDERLINE_REGEX.match
+    underline_characters = _UNDERLINE_CHARACTERS
+
+    previous_line = None
+    for line_num, line in enumerate(lines, 1):
+        line = line.rstrip()
+
+        kind = line[:opening]
+        if kind in tags:
+            yield Token(kind, line_num, line, line[opening:])
+        elif line[:ending] in tags:
+            yield Token(line[:ending], line_num, line, line[ending:])
+        elif line[:1] in underline_characters and \
+                previous_line is not None and match_underline(line):
+            yield Token(TOKEN_HDG, line_num, line, (line[0], previous_line))
+        else:
+            yield Token(TOKEN_TXT, line_num, line, line)
+
+        previous_line = line
+
+
+def preprocess(tokens, lines=False):
+    """First pass to analyze various points from a tokenized document:
+    - load traceability (if any) from TAG_LNK marks, with their line numbers
+      if lines is True
     - load used requirement identifiers from TAG_BRB and TAG_RRI marks
-    - load document structure from reST formatting
+    - load included requirement identifiers, in order, from TAG_IPR marks
+    - load document structure from reST formatting, and index its sections
     """
     result = {
         "identifiers": IdFactory(),
+        "inclusions": list(),
+        "sections": list(),
         "structure": list(),
-        "traceability": collections.defaultdict(set),
+        "traceability": TraceabilityGraph(lines),
     }
 
+    for token in analyze(tokens, result):
+        pass
+
+    return result
+
+
+def analyze(tokens, result):
+    """Update preprocess() result with tokens, while iterating over them
+
+    This way, a command can analyze a document while it is processing it,
+    instead of in a preliminary pass. Sections are indexed once all tokens
+    have been iterated over
+    """
     codes = list()
 
+    # Sections whose end is not known yet, as lists of Section fields
+    open_sections = list()
+    line_num = 0
+
+    # Links are the most frequent delimiters of large documents: they are
+    # tested first
+    add_link = result["traceability"].add_link
+
     # Three analysis at the price of one!
-    for i, line in enumerate(lines):
-        line_num = i + 1
+    for token in tokens:
+        yield token
+        kind = token.kind
+        line_num = token.line_num
+
+        if kind == TOKEN_TXT:
+            pass
+
+        # Traceability
+        elif kind == TAG_LNK:
+            req_ids = token.value.split()
+            add_link(req_ids[0], req_ids[1], line_num)
 
         # Identifiers
-        if line.startswith(TAG_RRI):
-            req_id = line[len(TAG_RRI):].lstrip()
-            result["identifiers"].add(req_id)
+        elif kind == TAG_RRI:
+            req_id = token.value.lstrip()
+            result["identifiers"].add(req_id, kind, token.line_num)
 
-        elif line.startswith(TAG_BRB):
-            req_id = _isolate_id(line, line_num)
+        elif kind == TAG_BRB:
+            req_id = _isolate_id(token)
             if req_id in result["identifiers"]:
-                logging.error("line {}: '{}' identifier is not unique".format(
-                    line_num, req_id))
+                origin, line_num = result["identifiers"].origin(req_id)
+                logging.error(
+                    "line {}: '{}' identifier is not unique ".format(
+                        token.line_num, req_id) +
+                    "(see {} at line {})".format(origin, line_num))
             elif req_id is not None:
-                result["identifiers"].add(req_id)
-
-        # Traceability
-        elif line.startswith(TAG_LNK):
-            req_ids = line[len(TAG_LNK):].split()
-            result["traceability"][req_ids[0]].add(req_ids[1])
+                result["identifiers"].add(req_id, kind, token.line_num)
 
-        elif line.startswith(TAG_DLN):
-            req_id = line[len(TAG_DLN):].split()[0]
-            result["traceability"][req_id].add(None)
+        elif kind == TAG_DLN:
+            req_id = token.value.split()[0]
+            result["traceability"].set_derived(req_id, token.line_num)
 
-        elif line.startswith(TAG_IPR):
-            req_id = line[len(TAG_IPR):].split()[0]
-            result["traceability"][req_id].update(set())
+        elif kind == TAG_IPR:
+            req_id = token.value.split()[0]
+            result["traceability"].add_requirement(req_id, token.line_num)
+            result["inclusions"].append(req_id)
 
         # Structure
-        if line_num > 1:
-            prefix = line[:4]
-            if len(prefix) == 4:
-                code = prefix[0]
-                if prefix.count(code) == 4 \
-                   and code in "!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~":
-                    if code not in codes:
-                        codes.append(code)
-                    level = codes.index(code)
-
-                    result["structure"].append((level, lines[i - 1]))
+        elif kind == TOKEN_HDG:
+            code, title = token.value
+            if code not in codes:
+                codes.append(code)
+            level = codes.index(code)
 
-    return result
+            result["structure"].append((level, title))
+
+            # A section ends where the next one of the same or of a higher
+            # level starts, at its title line
+            while len(open_sections) > 0 and open_sections[-1][0] >= level:
+                _close_section(result, open_sections.pop(), line_num - 2)
+            open_sections.append([level, title, line_num - 1, None,
+                                  len(result["inclusions"]), None])
+
+    while len(open_sections) > 0:
+        _close_section(result, open_sections.pop(), line_num)
+
+    # Sections are closed from the innermost ones: they are indexed in order
+    # of their title line
+    result["sections"].sort(key=lambda section: section.first_line)
+
+
+# Section of a document, from its title line to its last line (both
+# included), with the range of its inclusions in preprocess() results
+Section = collections.namedtuple("Section", [
+    "level", "title", "first_line", "last_line", "first_inclusion",
+    "last_inclusion"])
+
+
+def _close_section(result, fields, last_line):
+    fields[3] = last_line
+    fields[5] = len(result["inclusions"])
+    result["sections"].append(Section(*fields))
+
+
+class PreprocessCache(object):
+    """Persistent cache of preprocess() results, stored in a directory
+
+    Results are stored by a hash of document content, so that they are
+    invalidated as soon as document changes. When the total size of the
+    cache exceeds its maximum, least recently used results are evicted.
+
+    Results are stored as plain data, with marshal: loading a cache entry
+    never runs any code, whoever has written it.
+    """
+
+    # To be updated each time preprocess() results change
+    VERSION = 8
+
+    # Objects of preprocess() results, by name, stored as their state
+    _OBJECTS = {
+        "identifiers": IdFactory,
+        "traceability": TraceabilityGraph,
+    }
+
+    def __init__(self, directory, max_size):
+        self._directory = directory
+        self._max_size = max_size
+
+    @staticmethod
+    def default_directory():
+        """Cache directory of current user, as of XDG base directories
+        """
+        root = os.environ.get("XDG_CACHE_HOME", "")
+        if not os.path.isabs(root):
+            root = os.path.join(os.path.expanduser("~"), ".cache")
+
+        return os.path.join(root, "prk")
+
+    def key(self, input_file, lines=False):
+        """Hash of input file content, read from its current position, for
+        results with line numbers or not
+        """
+        result = hashlib.sha1("{}\n{}\n".format(self.VERSION,
+                                                lines).encode("utf-8"))
+        for chunk in iter(functools.partial(input_file.read, 1 << 20), ""):
+            result.update(chunk.encode("utf-8", "surrogateescape"))
+
+        return result.hexdigest()
+
+    def get(self, key):
+        """Cached result, or None if there is none
+        """
+        result = None
+
+        path = os.path.join(self._directory, key)
+        try:
+            with open(path, "rb") as input_file:
+                result = self._from_data(marshal.load(input_file))
+            os.utime(path)
+            logging.info("Preprocessing results loaded from cache")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning("Discarding invalid cache entry '{}': {}".format(
+                path, e))
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error(e)
+
+        return result
+
+    def put(self, key, result):
+        os.makedirs(self._directory, exist_ok=True)
+
+        path = os.path.join(self._directory, key)
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(temporary_path, "wb") as output_file:
+                marshal.dump(self._as_data(result), output_file)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            logging.warning("Cannot write cache entry '{}': {}".format(
+                path, e))
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        else:
+            self._evict()
+
+    def _as_data(self, result):
+        data = dict(result)
+        for name in self._OBJECTS:
+            if name in data:
+                data[name] = data[name].__getstate__()
+        if "sections" in data:
+            data["sections"] = [tuple(section)
+                                for section in data["sections"]]
+
+        return data
+
+    def _from_data(self, data):
+        result = dict(data)
+        for name, cls in self._OBJECTS.items():
+            if name in result:
+                value = cls.__new__(cls)
+                value.__setstate__(result[name])
+                result[name] = value
+        if "sections" in result:
+            result["sections"] = [Section(*section)
+                                  for section in result["sections"]]
+
+        return result
+
+    def _evict(self):
+        entries = list()
+        total_size = 0
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+        entries.sort()
+        while total_size > self._max_size and len(entries) > 0:
+            mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
 
 
 class Requirement(dict):
@@ -267,12 +1164,115 @@ class Requirement(dict):
 
     Only "text" is a reserved key. As requirement identifier is not an
     attribute of the dictionary itself, no key is reserved in order to store it
+
+    A field is set either from a string or from a list of lines. It is stored
+    once as a block: a single string, whose lines have no trailing spaces,
+    and with neither leading nor trailing blank lines. Fields shall be set
+    by item assignment only
+
+    Fields of a requirement stored as a directory are read only once they
+    are accessed (by item, get(), items(), values(), ...). Until then, they
+    are pending: call load() before handing requirement over to code that
+    reads it as a mere dictionary (e.g. dict(requirement)). Field names are
+    known without reading any file
     """
 
+    __slots__ = ("_id",)
+
+    # Size from which a field file is memory-mapped rather than read
+    MMAP_THRESHOLD = 1 << 20
+
     def __init__(self):
-        self["text"] = list()
+        # An empty text is already a block
+        dict.__setitem__(self, "text", "")
         self._id = None
 
+    def __setitem__(self, field, value):
+        super().__setitem__(sys.intern(field), self._as_block(value))
+
+    def __getitem__(self, field):
+        value = super().__getitem__(field)
+        if type(value) is _PendingField:
+            value = self._read_pending_field(field, value)
+        return value
+
+    def __eq__(self, other):
+        if isinstance(other, Requirement):
+            self.load()
+            other.load()
+        return super().__eq__(other)
+
+    def get(self, field, default=None):
+        if field in self:
+            return self[field]
+        return default
+
+    def items(self):
+        self.load()
+        return super().items()
+
+    def values(self):
+        self.load()
+        return super().values()
+
+    def pop(self, field, *default):
+        if field in self:
+            self[field]
+        return super().pop(field, *default)
+
+    def popitem(self):
+        if len(self) > 0:
+            self[next(reversed(self))]
+        return super().popitem()
+
+    def setdefault(self, field, default=None):
+        if field not in self:
+            self[field] = default
+        return self[field]
+
+    def copy(self):
+        result = Requirement()
+        result.update(self.items())
+        result.id = self.id
+
+        return result
+
+    def __ne__(self, other):
+        return not self == other
+
+    def load(self):
+        """Read fields that are still pending
+        """
+        for field, value in super().items():
+            if type(value) is _PendingField:
+                self._read_pending_field(field, value)
+
+    def _read_pending_field(self, field, pending):
+        with open(pending.path, "rt") as input_file:
+            size = os.fstat(input_file.fileno()).st_size
+            if size < self.MMAP_THRESHOLD:
+                content = input_file.read()
+            else:
+                with mmap.mmap(input_file.fileno(), 0,
+                               access=mmap.ACCESS_READ) as data:
+                    content = str(data, input_file.encoding)
+        if len(_HOOKS) > 0:
+            _notify("read", pending.path, size)
+
+        result = self._as_block(content)
+        super().__setitem__(field, result)
+
+        return result
+
+    @staticmethod
+    def _as_block(value):
+        if isinstance(value, str):
+            value = value.split("\n")
+
+        # Blank lines around the block are all that remains of newlines at
+        # its ends, once its lines are right-stripped
+        return "\n".join([line.rstrip() for line in value]).strip("\n")
+
     @property
     def id(self):
         return self._id
@@ -282,26 +1282,17 @@ class Requirement(dict):
         self._id = value
 
     def get_field_as_block(self, field):
-        lines = self[field]
-
-        # Sanitation
-        for i in range(len(lines)):
-            lines[i] = lines[i].rstrip()
-        while len(lines) > 0 and len(lines[0]) == 0:
-            del lines[0]
-        while len(lines) > 0 and len(lines[-1]) == 0:
-            del lines[-1]
-
-        # Output
-        return "\n".join(lines)
+        """Field as a block (see class documentation), as it is stored
+        """
+        return self[field]
 
     def as_inline_text(self):
         blocks = list()
 
-        blocks.append(self.get_field_as_block("text"))
+        blocks.append(self["text"])
         for k in sorted(self):
             if k != "text":
-                v = self.get_field_as_block(k)
+                v = self[k]
                 if len(v) == 0:
                     blocks.append("{} {}".format(TAG_BTB, k))
                 elif "\n" in v:
@@ -312,32 +1303,124 @@ class Requirement(dict):
 
         return "\n\n".join(blocks)
 
+    def reflowed(self, width):
+        """Copy of requirement, whose fields are reflowed on width columns
+        """
+        reflow = _formatter().reflow
+
+        result = Requirement()
+        for field in self:
+            result[field] = reflow(self[field], width)
+        result.id = self.id
+
+        return result
+
     def as_plain_text(self, configuration, used_ids):
+        """Store requirement as a single file
+
+        Returns True if file has actually been written
+        """
         if self.id is None:
             self.id = used_ids.generate(self.get_field_as_block("text"))
 
-        with open(os.path.join(configuration["output_root"], self.id + ".prk"),
-                  "wt") as output_file:
-            output_file.write(self.as_inline_text() + "\n")
+        return _write_if_changed(
+            os.path.join(configuration["output_root"], self.id + ".prk"),
+            self.as_inline_text() + "\n")
 
     def as_directory(self, configuration, used_ids):
+        """Store requirement as a directory, with a file per field
+
+        Files of fields that are not part of the requirement anymore are
+        removed. Returns True if directory has actually been modified
+        """
         if self.id is None:
             self.id = used_ids.generate(self.get_field_as_block("text"))
 
+        result = False
+
         path = os.path.join(configuration["output_root"], self.id)
         os.makedirs(path, exist_ok=True)
         for field in self:
-            with open(os.path.join(path, field), "wt") as output_file:
-                output_file.write(self.get_field_as_block(field))
+            if _write_if_changed(os.path.join(path, field),
+                                 self.get_field_as_block(field)):
+                result = True
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name not in self and not entry.name.startswith(".") \
+                   and entry.is_file():
+                    os.remove(entry.path)
+                    result = True
+
+        return result
 
     @staticmethod
-    def from_directory_content(path):
+    def from_directory_content(path, lazy=True):
+        """Requirement whose fields are the files of a directory. They are
+        pending (see class documentation) if lazy is True
+        """
         result = Requirement()
 
-        root, dirs, files = next(os.walk(path))
-        for f in files:
-            with open(os.path.join(root, f), "rt") as input_file:
-                result[f] = input_file.read().split("\n")
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    dict.__setitem__(result, sys.intern(entry.name),
+                                     _PendingField(entry.path))
+        if not lazy:
+            result.load()
+
+        return result
+
+    @staticmethod
+    def from_inline_text(text):
+        """Requirement given in the form of as_inline_text(): its TAG_BTB
+        blocks are its fields other than "text", as in 'split' input
+        """
+        fields = {"text": list()}
+        field = "text"
+        require_etb = 0
+        for token in tokenize(text.split("\n")):
+            if token.kind == TAG_BTB and field == "text":
+                match = _FIELD_REGEX.match(token.value)
+                if match:
+                    field = match.group(1)
+                    if len(match.group(2)) == 0:
+                        require_etb = 1  # maybe
+                        fields[field] = list()
+                    else:
+                        require_etb = 0  # not required
+                        fields[field] = [match.group(2)]
+                    continue
+            elif token.kind == TAG_ETB and field != "text":
+                field = "text"
+                continue
+
+            if field != "text" and require_etb < 2 and len(token.line) == 0:
+                field = "text"
+            elif field != "text" and require_etb == 1:
+                require_etb = 2
+            fields[field].append(token.line)
+
+        result = Requirement()
+        for field, lines in fields.items():
+            result[field] = lines
+
+        return result
+
+    @staticmethod
+    def from_revision(revision, path, is_directory):
+        """Requirement stored at path in a GitRevision, either as a directory
+        or as a single file
+        """
+        result = Requirement()
+
+        if is_directory:
+            for name, is_field_directory in revision.list_directory(path):
+                if not is_field_directory:
+                    result[name] = revision.read_text(os.path.join(path,
+                                                                   name))
+        else:
+            result["text"] = revision.read_text(path + ".prk")
 
         return result
 
@@ -348,10 +1431,850 @@ class Requirement(dict):
         result = Requirement()
 
         with open(path, "rt") as input_file:
-            result["text"] = input_file.read().split("\n")
+            result["text"] = input_file.read()
+            if len(_HOOKS) > 0:
+                _notify("read", path, os.fstat(input_file.fileno()).st_size)
+
+        return result
+
+
+class _PendingField(object):
+    """Field of a requirement, whose file has not been read yet
+    """
+
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+
+class RequirementArchive(object):
+    """Packed storage of requirements (storage mode 2)
+
+    Requirements are stored one after the other, in their plain text form, in
+    a single data file. An index file gives for each of them its offset and
+    size in data file. Data file is memory-mapped, so that reading a
+    requirement costs neither a system call nor a copy.
+
+    Stored requirements can be replaced or discarded. Changes are only applied
+    to files on commit.
+    """
+
+    DATA_FILE = "prk-archive.dat"
+    INDEX_FILE = "prk-archive.idx"
+
+    def __init__(self, root, revision=None):
+        self._data_path = os.path.join(root, self.DATA_FILE)
+        self._index_path = os.path.join(root, self.INDEX_FILE)
+
+        self._index = dict()
+        self._data = b""
+        self._mmap = None
+
+        self._spool = None
+        self._spool_index = dict()
+        self._discarded = set()
+
+        # Archive of a GitRevision can only be read
+        if revision is not None:
+            try:
+                index = revision.read_text(self._index_path)
+            except FileNotFoundError:
+                return
+            for line in index.split("\n")[:-1]:
+                req_id, offset, size = line.split()
+                self._index[req_id] = (int(offset), int(size))
+            self._data = revision.read(self._data_path)
+
+        elif os.path.exists(self._index_path):
+            with open(self._index_path, "rt") as index_file:
+                for line in index_file:
+                    req_id, offset, size = line.split()
+                    self._index[req_id] = (int(offset), int(size))
+
+            with open(self._data_path, "rb") as data_file:
+                if os.fstat(data_file.fileno()).st_size > 0:
+                    self._mmap = mmap.mmap(data_file.fileno(), 0,
+                                           access=mmap.ACCESS_READ)
+                    self._data = memoryview(self._mmap)
+
+    def __contains__(self, req_id):
+        return req_id in self._index
+
+    def __iter__(self):
+        """Iterates over the identifiers of stored requirements, in order
+        """
+        for req_id in sorted(self._index):
+            yield req_id
+
+    def close(self):
+        if self._mmap is not None:
+            self._data.release()
+            self._mmap.close()
+            self._data = b""
+            self._mmap = None
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def get(self, req_id):
+        """Stored requirement whose identifier is req_id
+        """
+        offset, size = self._index[req_id]
+        _notify("read", None, size)
+
+        result = Requirement.from_inline_text(
+            str(self._data[offset:offset + size], "utf-8"))
+        result.id = req_id
+
+        return result
+
+    def store(self, requirement):
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile()
+
+        content = (requirement.as_inline_text() + "\n").encode("utf-8")
+        self._spool_index[requirement.id] = (self._spool.tell(), len(content))
+        self._spool.write(content)
+        self._discarded.discard(requirement.id)
+
+    def discard(self, req_id):
+        self._spool_index.pop(req_id, None)
+        self._discarded.add(req_id)
+
+    def commit(self):
+        """Write archive files, if their content actually changes
+
+        Returns True if files have actually been written
+        """
+        req_ids = set(self._index).union(self._spool_index)
+        req_ids.difference_update(self._discarded)
+
+        result = False
+        if len(req_ids) == 0:
+            for path in [self._index_path, self._data_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+                    result = True
+            return result
+
+        data_path = self._data_path + ".{}.tmp".format(os.getpid())
+        index_path = self._index_path + ".{}.tmp".format(os.getpid())
+        try:
+            offset = 0
+            with open(data_path, "wb") as data_file, \
+                    open(index_path, "wt") as index_file:
+                for req_id in sorted(req_ids):
+                    if req_id in self._spool_index:
+                        spool_offset, size = self._spool_index[req_id]
+                        self._spool.seek(spool_offset)
+                        data_file.write(self._spool.read(size))
+                    else:
+                        old_offset, size = self._index[req_id]
+                        data_file.write(self._data[old_offset:old_offset +
+                                                   size])
+                    index_file.write("{} {} {}\n".format(req_id, offset, size))
+                    offset += size
+                index_size = index_file.tell()
+
+            for new_path, path in [(data_path, self._data_path),
+                                   (index_path, self._index_path)]:
+                if os.path.exists(path) \
+                   and filecmp.cmp(new_path, path, shallow=False):
+                    os.remove(new_path)
+                else:
+                    os.replace(new_path, path)
+                    result = True
+                    _notify("write", path,
+                            offset if path == self._data_path else index_size)
+        finally:
+            for path in [data_path, index_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        return result
+
+
+class GitRevision(object):
+    """Files of a revision of the git repository of directory (current one
+    by default)
+
+    Files are read through a single 'git cat-file --batch' process, with
+    neither checkout nor process spawn per file. Paths are given as in the
+    working tree, either relatively to current directory or absolute.
+    Revision is resolved once, so that files are all read from the same
+    commit. Entries of listed directories are then read by their object
+    identifier, which spares git a lookup of their path.
+    """
+
+    def __init__(self, revision, directory=None):
+        process = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel", "--verify", "--quiet",
+             revision + "^{commit}"], cwd=directory,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True)
+        lines = process.stdout.split()
+        if process.returncode != 0 or len(lines) != 2:
+            raise ValueError("'{}' is not a revision of a git repository"
+                             .format(revision))
+        self._toplevel, self._commit = lines
+
+        # Object identifiers of the entries of listed directories, by path
+        # in repository
+        self._objects = dict()
+
+        self._lock = threading.Lock()
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"], cwd=self._toplevel,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
+
+    def read(self, path, kind="blob"):
+        """Content of file (or raw content of tree, if kind is "tree") at
+        revision, as bytes
+        """
+        name = self._name(path)
+        request = self._objects.get(name)
+        if request is None:
+            request = "{}:{}".format(self._commit, name)
+
+        with self._lock:
+            self._process.stdin.write(
+                (request + "\n").encode("utf-8", "surrogateescape"))
+            self._process.stdin.flush()
+
+            header = self._process.stdout.readline().split()
+            if len(header) == 3:
+                size = int(header[2])
+                content = self._process.stdout.read(size + 1)[:size]
+
+        if len(header) != 3 or header[1].decode() != kind:
+            raise FileNotFoundError("No {} '{}' at revision {}".format(
+                "file" if kind == "blob" else "directory", path,
+                self._commit))
+        _notify("read", path, size)
+
+        return content
+
+    def _name(self, path):
+        """Path in repository of a path of working tree
+        """
+        result = os.path.relpath(os.path.abspath(path), self._toplevel)
+        if result == os.curdir:
+            return ""
+        if result.startswith(os.pardir):
+            raise FileNotFoundError(
+                "'{}' is outside of git repository".format(path))
+        return result
+
+    def read_text(self, path):
+        """Content of file at revision, read as a text file
+        """
+        return self.open(path).read()
+
+    def open(self, path):
+        """File at revision, as a text flow
+        """
+        content = io.BytesIO(self.read(path))
+        content.name = path
+
+        return io.TextIOWrapper(content,
+                                encoding=locale.getpreferredencoding(False))
+
+    def list_directory(self, path):
+        """Entries of directory at revision, as (name, is_directory) pairs
+        """
+        content = self.read(path, "tree")
+        digest_size = len(self._commit) // 2
+        prefix = self._name(path)
+
+        result = list()
+        i = 0
+        while i < len(content):
+            space = content.index(b" ", i)
+            end = content.index(b"\0", space)
+            mode = content[i:space]
+            name = os.fsdecode(content[space + 1:end])
+            digest = content[end + 1:end + 1 + digest_size]
+            i = end + 1 + digest_size
+
+            result.append((name, mode == b"40000"))
+            self._objects[os.path.join(prefix, name)] = digest.hex()
+
+        return result
+
+
+class RequirementIndex(object):
+    """Storage modes of the requirements stored as directories (mode 1) or as
+    single files (mode 0) in a directory, found by a single scan of it. The
+    directory is read from a GitRevision, if any
+    """
+
+    def __init__(self, root, revision=None):
+        # Whether each requirement is stored as a directory, in scan order
+        self._kinds = dict()
+
+        if revision is not None:
+            entries = revision.list_directory(root)
+        else:
+            with os.scandir(root if len(root) > 0 else ".") as scan:
+                entries = [(entry.name, entry.is_dir()) for entry in scan
+                           if entry.is_dir() or entry.name.endswith(".prk")
+                           and entry.is_file()]
+
+        for name, is_directory in entries:
+            if is_directory:
+                self._kinds[name] = True
+            elif name.endswith(".prk"):
+                self._kinds.setdefault(name[:-4], False)
+
+        self._ranks = {req_id: rank for rank, req_id in enumerate(self._kinds)}
+
+    def __contains__(self, req_id):
+        return req_id in self._kinds
+
+    def is_directory(self, req_id):
+        """Whether requirement is stored as a directory (higher priority) or
+        as a single file. KeyError is raised if it is not stored at all
+        """
+        return self._kinds[req_id]
+
+    def ordered(self, req_ids):
+        """Stored requirements among req_ids, in the order they have been
+        found in directory, which is the order they are best read in
+        """
+        return sorted((req_id for req_id in req_ids if req_id in self._kinds),
+                      key=self._ranks.__getitem__)
+
+
+class RequirementLoader(object):
+    """Loader of the requirements included by a document
+
+    Requirements are expected to be requested in the order of their inclusion
+    in the document. Up to configuration["prefetch"] of them are read ahead by
+    a pool of threads (none by default, as it rather slows down small
+    requirements stored on a local disk). Fields of the ones stored as
+    directories are read ahead too, unless fields is False, for callers that
+    only need the names of fields: they are then read once accessed.
+    Requirements included several times are read only once, and kept in
+    memory until their last inclusion.
+
+    Requirements are located by a RequirementIndex of input root, if not
+    given one. Requirements that are not stored are all reported at once,
+    by a FileNotFoundError, before any of them is read.
+    """
+
+    def __init__(self, configuration, req_ids, index=None, fields=True):
+        self._configuration = configuration
+        self._depth = configuration.get("prefetch", 0)
+        self._fields = fields
+
+        # Reads from a git revision all go through the same pipe
+        if configuration.get("revision") is not None:
+            self._depth = 0
+
+        self._pending = collections.deque(req_ids)
+        self._futures = dict()
+
+        self._uses = collections.Counter(req_ids)
+        self._cache = dict()
+
+        self._archive = None
+        if configuration.get("storage") == 2:
+            self._archive = RequirementArchive(configuration["input_root"],
+                                               configuration.get("revision"))
+
+        self._index = index
+        if index is None:
+            self._index = RequirementIndex(configuration["input_root"],
+                                           configuration.get("revision"))
+
+        missing_ids = [req_id for req_id in self._uses
+                       if req_id not in self._index and
+                       (self._archive is None or req_id not in self._archive)]
+        if len(missing_ids) > 0:
+            if self._archive is not None:
+                self._archive.close()
+            raise FileNotFoundError(
+                "{} requirement(s) not found in '{}': {}".format(
+                    len(missing_ids), configuration["input_root"] or ".",
+                    ", ".join(missing_ids)))
+
+        self._executor = None
+        if self._depth > 0:
+            # Threads are only imported when actually used
+            import concurrent.futures
+
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._depth)
+            self._prefetch()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            for future in self._futures.values():
+                future.cancel()
+            self._executor.shutdown()
+            self._executor = None
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def get(self, req_id):
+        """Requirement whose identifier is req_id
+        """
+        with Phase("load"):
+            if req_id in self._cache:
+                result = self._cache[req_id]
+            elif req_id in self._futures:
+                result = self._futures.pop(req_id).result()
+            else:
+                result = _load_requirement(self._configuration, req_id,
+                                           self._archive, self._index)
+
+        # Keep requirement only if it is included again later
+        self._uses[req_id] -= 1
+        if self._uses[req_id] > 0:
+            self._cache[req_id] = result
+        else:
+            self._cache.pop(req_id, None)
+
+        if self._executor is not None:
+            self._prefetch()
+
+        return result
+
+    def _prefetch(self):
+        while len(self._pending) > 0 and len(self._futures) < self._depth:
+            req_id = self._pending.popleft()
+            if req_id not in self._futures and req_id not in self._cache:
+                self._futures[req_id] = self._executor.submit(
+                    self._load_ahead, req_id)
+
+    def _load_ahead(self, req_id):
+        result = _load_requirement(self._configuration, req_id,
+                                   self._archive, self._index)
+        if self._fields:
+            result.load()
+
+        return result
+
+
+def _gzip_flow(flow, path):
+    """gzip compressed flow of a file, written into its raw flow
+    """
+    # Highest level, by default, is much slower for little gain
+    return gzip.GzipFile(path, "wb", compresslevel=6, fileobj=flow)
+
+
+def _xz_flow(flow, path):
+    """xz compressed flow of a file, written into its raw flow
+    """
+    return lzma.LZMAFile(flow, "wb", preset=6)
+
+
+class OutputSink(object):
+    """Buffered output of a command, to standard output or to a file
+
+    Written text is encoded and written by chunks of CHUNK_SIZE bytes,
+    straight into a binary flow. A file whose name ends with one of
+    COMPRESSORS suffixes is compressed on the fly. It is written under a
+    temporary name, and replaces its target only once sink is closed, so that
+    readers never get a partial output.
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    # Compressed flows, by suffix of target file, from its raw flow
+    COMPRESSORS = {
+        ".gz": _gzip_flow,
+        ".xz": _xz_flow,
+    }
+
+    def __init__(self, path=None):
+        self.name = path
+
+        if path is None:
+            # Text already written by other means shall come first
+            sys.stdout.flush()
+            self._file = open(sys.stdout.fileno(), "wb", buffering=0,
+                              closefd=False)
+            flow = self._file
+            encoding = sys.stdout.encoding
+            errors = sys.stdout.errors
+        else:
+            self._temporary_path = os.path.join(
+                os.path.dirname(path), ".{}.{}-{}.tmp".format(
+                    os.path.basename(path), os.getpid(),
+                    threading.get_ident()))
+            self._file = open(self._temporary_path, "wb", buffering=0)
+            flow = self._file
+            compressor = self.COMPRESSORS.get(os.path.splitext(path)[1])
+            if compressor is not None:
+                flow = compressor(self._file, path)
+            encoding = locale.getpreferredencoding(False)
+            errors = "strict"
+
+        self._text = io.TextIOWrapper(
+            io.BufferedWriter(flow, self.CHUNK_SIZE), encoding=encoding,
+            errors=errors)
+
+        # Writes do not go through any Python code
+        self.write = self._text.write
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def flush(self):
+        self._text.flush()
+
+    def close(self):
+        """Write remaining text, then replace target file, if any
+        """
+        if self._text is None:
+            return
+
+        with Phase("close output"):
+            # Standard output is not closed, as its descriptor is not owned
+            self._text.close()
+            self._file.close()
+            if self.name is not None:
+                os.replace(self._temporary_path, self.name)
+                if len(_HOOKS) > 0:
+                    _notify("write", self.name, os.path.getsize(self.name))
+        self._text = None
+
+    def discard(self):
+        """Leave target file unchanged. Standard output cannot be taken back,
+        and is only flushed
+        """
+        if self._text is None:
+            return
+
+        try:
+            self._text.close()
+        except OSError:
+            # Output is dropped anyway, or its reader has gone
+            pass
+        finally:
+            self._file.close()
+            if self.name is not None:
+                os.remove(self._temporary_path)
+        self._text = None
+
+
+def _write_if_changed(path, content):
+    """Replace file content, unless it is already the expected one
+
+    File is replaced atomically, in order for readers never to get a partially
+    written file, and keeps its permissions. Returns True if file has
+    actually been written
+    """
+    mode = None
+    try:
+        with open(path, "rt") as input_file:
+            mode = os.fstat(input_file.fileno()).st_mode
+            if input_file.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    temporary_path = os.path.join(
+        os.path.dirname(path), ".{}.{}-{}.tmp".format(
+            os.path.basename(path), os.getpid(), threading.get_ident()))
+    try:
+        with open(temporary_path, "wt") as output_file:
+            output_file.write(content)
+        if mode is not None:
+            os.chmod(temporary_path, mode)
+        os.replace(temporary_path, path)
+        if len(_HOOKS) > 0:
+            _notify("write", path, os.path.getsize(path))
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    return True
+
+
+def _remove_requirement(configuration, req_id, storages):
+    """Remove stored requirement from the specified per-file storage modes
+    """
+    path = os.path.join(configuration["output_root"], req_id)
+
+    if 0 in storages and os.path.isfile(path + ".prk"):
+        logging.info("Removing '{}'".format(path + ".prk"))
+        os.remove(path + ".prk")
+    if 1 in storages and os.path.isdir(path):
+        logging.info("Removing '{}'".format(path))
+        shutil.rmtree(path)
+
+
+# Requirements loaded by current process, by path, when they can be shared
+# between several documents or requests (see run_workspace and run_server).
+# Each one is stored with the signature of its files when it was read
+_SHARED_REQUIREMENTS = None
 
+
+def _load_requirement(configuration, req_id, archive=None, index=None):
+    _notify("requirement", req_id)
+
+    # Archive, if any, has the highest priority. Then, give higher priority to
+    # requirement management with directory than by file
+    if archive is not None and req_id in archive:
+        return archive.get(req_id)
+
+    path = os.path.join(configuration["input_root"], req_id)
+    if index is not None:
+        is_directory = index.is_directory(req_id)
+    else:
+        is_directory = os.path.isdir(path)
+
+    if configuration.get("revision") is not None:
+        result = Requirement.from_revision(configuration["revision"], path,
+                                           is_directory)
+        result.id = req_id
         return result
 
+    if _SHARED_REQUIREMENTS is not None:
+        path = os.path.abspath(path)
+        signature = _requirement_signature(path, is_directory)
+        if path in _SHARED_REQUIREMENTS \
+           and _SHARED_REQUIREMENTS[path][0] == signature:
+            return _SHARED_REQUIREMENTS[path][1]
+
+    if is_directory:
+        result = Requirement.from_directory_content(path)
+    else:
+        result = Requirement.from_file_content(path + ".prk")
+    result.id = req_id
+
+    if _SHARED_REQUIREMENTS is not None:
+        _SHARED_REQUIREMENTS[path] = (signature, result)
+
+    return result
+
+
+def _requirement_signature(path, is_directory):
+    """Modification times and sizes of the files of a stored requirement
+    """
+    if is_directory:
+        result = list()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    result.append((entry.name, stat.st_mtime_ns,
+                                   stat.st_size))
+        return tuple(sorted(result))
+    else:
+        try:
+            stat = os.stat(path + ".prk")
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+##############################################################################
+# Statistics and profiling
+##############################################################################
+
+# Subscribers to the events of current process (see add_hook)
+_HOOKS = list()
+
+
+def add_hook(hook):
+    """Subscribe hook to the events of commands run by current process
+
+    hook is called as hook(event, name, value), possibly from several
+    threads, with one of the following events:
+
+    - "start": phase name has started (value is None);
+    - "end": phase name has ended, after value seconds;
+    - "read": value bytes have been read from file name (None for a
+      requirement read from an archive, which opens no file);
+    - "write": value bytes have been written to file name;
+    - "requirement": requirement name has been loaded (value is None).
+    """
+    _HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    _HOOKS.remove(hook)
+
+
+def _notify(event, name, value=None):
+    for hook in _HOOKS:
+        hook(event, name, value)
+
+
+class Phase(object):
+    """Context of a phase of a command, whose start and end are notified to
+    hooks. A phase can be entered several times (e.g. "load" phase, once per
+    requirement), and can contain other phases
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        if len(_HOOKS) > 0:
+            _notify("start", self.name)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._start is not None:
+            _notify("end", self.name, time.perf_counter() - self._start)
+            self._start = None
+
+
+class Statistics(object):
+    """Hook that accumulates the events of a command: wall time and count of
+    each phase, files read and written with their sizes, and loaded
+    requirements. Peak memory of Python allocations is traced from start()
+    to stop()
+    """
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.peak_memory = 0
+        self.phases = dict()
+        self.files_read = 0
+        self.bytes_read = 0
+        self.files_written = 0
+        self.bytes_written = 0
+        self.requirements = 0
+
+        self._lock = threading.Lock()
+        self._start = None
+
+    def __call__(self, event, name, value):
+        with self._lock:
+            if event == "end":
+                count, duration = self.phases.get(name, (0, 0.0))
+                self.phases[name] = (count + 1, duration + value)
+            elif event == "read":
+                if name is not None:
+                    self.files_read += 1
+                self.bytes_read += value
+            elif event == "write":
+                self.files_written += 1
+                self.bytes_written += value
+            elif event == "requirement":
+                self.requirements += 1
+
+    def start(self):
+        tracemalloc.start()
+        add_hook(self)
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.wall_time = time.perf_counter() - self._start
+        remove_hook(self)
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def as_dict(self):
+        return {
+            "wall_time": self.wall_time,
+            "peak_memory": self.peak_memory,
+            "files_read": self.files_read,
+            "bytes_read": self.bytes_read,
+            "files_written": self.files_written,
+            "bytes_written": self.bytes_written,
+            "requirements": self.requirements,
+            "phases": {name: {"count": count, "time": duration}
+                       for name, (count, duration) in self.phases.items()},
+        }
+
+    def report(self, output_file, output_format="text"):
+        if output_format == "json":
+            # JSON is only needed by this report format
+            import json
+
+            output_file.write(json.dumps(self.as_dict(), sort_keys=True) +
+                              "\n")
+            return
+
+        output_file.write("Wall time: {:.3f} s\n".format(self.wall_time))
+        output_file.write("Peak memory: {} kB\n".format(
+            self.peak_memory // 1024))
+        output_file.write("Read: {} files, {} bytes\n".format(
+            self.files_read, self.bytes_read))
+        output_file.write("Written: {} files, {} bytes\n".format(
+            self.files_written, self.bytes_written))
+        output_file.write("Requirements: {}\n".format(self.requirements))
+        for name in sorted(self.phases):
+            count, duration = self.phases[name]
+            output_file.write("Phase {}: {:.3f} s ({} times)\n".format(
+                name, duration, count))
+
+
+class Instrumentation(object):
+    """Context of a command run from command line, that reports statistics
+    on standard error if configuration["stats"] is set ("text" or "json"),
+    and writes profiling data to configuration["profile"] file if set
+    """
+
+    def __init__(self, configuration):
+        self._configuration = configuration
+        self._statistics = None
+        self._profile = None
+
+    def __enter__(self):
+        if self._configuration.get("stats") is not None:
+            self._statistics = Statistics()
+            self._statistics.start()
+
+            # Main input is read by tokenize(), that knows nothing of files
+            input_file = self._configuration.get("input")
+            try:
+                _notify("read", input_file.name,
+                        os.fstat(input_file.fileno()).st_size)
+            except (AttributeError, OSError):
+                pass
+
+        if self._configuration.get("profile") is not None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profile is not None:
+            self._profile.disable()
+            try:
+                self._profile.dump_stats(self._configuration["profile"])
+            except OSError as e:
+                logging.error(e)
+            self._profile = None
+
+        if self._statistics is not None:
+            self._statistics.stop()
+            sys.stderr.flush()
+            self._statistics.report(sys.stderr, self._configuration["stats"])
+            self._statistics = None
+
 
 ##############################################################################
 # 'boost', 'cross' and 'track' commands implementation
@@ -362,54 +2285,161 @@ def boost(configuration):
     """Boost command outputs the list of requirement identifiers defined by
     the input document itself
     """
-    # Load main input and replace if with a list of lines
-    configuration["input"] = _load_file(configuration["input"])
-
     # Load traceability matrix, if any
-    linked_ids = preprocess(configuration["input"])["traceability"]
+    lines = _is_line_aware(configuration)
+    linked_ids = _preprocess_input(
+        configuration, functools.partial(tokenize, configuration["input"]),
+        lines=lines)["traceability"]
 
     # Output the list of defined requirements
-    for req_id in sorted(linked_ids):
-        configuration["output"].write("{}\n".format(req_id))
+    write = _record_writer(configuration, ["requirement", "line", "derived"],
+                           ["requirement"])
+    for req_id in linked_ids.requirements():
+        write((req_id, linked_ids.line(req_id) if lines else None,
+               linked_ids.is_derived(req_id)))
 
 
 def cross(configuration):
     """Cross command outputs the direct traceabilty matrix, a pair of
     requirements per line
     """
-    # Load main input and replace if with a list of lines
-    configuration["input"] = _load_file(configuration["input"])
-
     # Load traceability matrix, if any
-    linked_ids = preprocess(configuration["input"])["traceability"]
+    lines = _is_line_aware(configuration)
+    linked_ids = _preprocess_input(
+        configuration, functools.partial(tokenize, configuration["input"]),
+        lines=lines)["traceability"]
 
-    # Output the list of defined requirements
-    matrix = _transpose_matrix(linked_ids)
-    for ref_id in sorted(matrix):
-        if ref_id is not None:
-            for req_id in sorted(matrix[ref_id]):
-                configuration["output"].write("{} {}\n".format(ref_id, req_id))
+    # Output the list of defined requirements. Lines of links are only
+    # searched for if they are output
+    write = _record_writer(configuration, ["reference", "requirement", "line"],
+                           ["reference", "requirement"])
+    for ref_id, req_ids in linked_ids.rows(forward=False):
+        for req_id in req_ids:
+            write((ref_id, req_id,
+                   linked_ids.link_line(req_id, ref_id) if lines else None))
 
 
 def track(configuration):
     """Track command outputs the list of requirement identifiers referenced by
     the input document
     """
-    # Load main input and replace if with a list of lines
-    configuration["input"] = _load_file(configuration["input"])
-
     # Load traceability matrix, if any
-    linked_ids = preprocess(configuration["input"])["traceability"]
+    lines = _is_line_aware(configuration)
+    linked_ids = _preprocess_input(
+        configuration, functools.partial(tokenize, configuration["input"]),
+        lines=lines)["traceability"]
 
     # Output the list of defined requirements
-    ref_ids = set()
-    for req_id in linked_ids:
-        ref_ids.update(linked_ids[req_id])
+    write = _record_writer(configuration, ["reference", "line"],
+                           ["reference"])
+    for ref_id in linked_ids.referenced_ids():
+        write((ref_id, linked_ids.line(ref_id) if lines else None))
+
+
+def _record_writer(configuration, fields, text_fields):
+    """Function that outputs a record, given as a tuple of the values of
+    fields, in the format given by configuration["output_format"]:
+
+    - "text": values of text_fields only, separated by spaces;
+    - "jsonl": a JSON object per line;
+    - "csv" or "tsv": values of fields, after a header line.
+
+    Records are output as soon as they are given. They are not given as
+    dictionaries, as there may be one per link
+    """
+    output = configuration["output"]
+    output_format = configuration.get("output_format", "text")
+
+    if output_format == "text" and len(text_fields) == 1:
+        position = fields.index(text_fields[0])
+
+        def write(record):
+            output.write(record[position] + "\n")
+
+    elif output_format == "text":
+        get_values = operator.itemgetter(*map(fields.index, text_fields))
+
+        def write(record):
+            output.write(" ".join(get_values(record)) + "\n")
+
+    elif output_format == "jsonl":
+        # JSON is only needed by this output format
+        import json
+
+        def write(record):
+            output.write(json.dumps(dict(zip(fields, record))) + "\n")
+
+    else:
+        import csv
 
-    ref_ids.discard(None)
+        writer = csv.writer(output,
+                            delimiter="\t" if output_format == "tsv" else ",",
+                            lineterminator="\n")
+        writer.writerow(fields)
 
-    for ref_id in sorted(ref_ids):
-        configuration["output"].write("{}\n".format(ref_id))
+        def write(record):
+            writer.writerow(map(_csv_value, record))
+
+    return write
+
+
+def _is_line_aware(configuration):
+    """Whether records output by _record_writer() include line numbers
+    """
+    return configuration.get("output_format", "text") != "text"
+
+
+def _csv_value(value):
+    # Same representation of booleans than in JSON
+    if value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    else:
+        return value
+
+
+##############################################################################
+# 'impact' command implementation
+##############################################################################
+
+
+def impact(configuration):
+    """Impact command outputs the identifiers of all requirements that depend
+    on the given ones, at any depth of traceability
+
+    With configuration["depends"], it outputs instead all identifiers the
+    given requirements depend on. Cycles of traceability met on the way are
+    reported
+    """
+    def index(result):
+        return result["traceability"].index()
+
+    # Strongly connected components are kept in persistent cache, if enabled
+    linked_ids = _preprocess_input(
+        configuration, functools.partial(tokenize, configuration["input"]),
+        index, _is_line_aware(configuration))["traceability"]
+
+    req_ids = configuration["ids"]
+    for req_id in req_ids:
+        if req_id not in linked_ids and \
+           len(linked_ids.referrers(req_id)) == 0:
+            logging.error("'{}' is not part of traceability".format(req_id))
+
+    reached_ids = linked_ids.reachable(
+        req_ids, forward=configuration.get("depends", False))
+
+    # Report cycles involving given or reached requirements
+    involved_ids = set(req_ids).union(reached_ids)
+    for cycle in linked_ids.cycles():
+        if not involved_ids.isdisjoint(cycle):
+            logging.warning("Traceability cycle between {}".format(
+                ", ".join(cycle)))
+
+    write = _record_writer(configuration, ["identifier", "line"],
+                           ["identifier"])
+    for req_id in reached_ids:
+        write((req_id, linked_ids.line(req_id)))
 
 
 ##############################################################################
@@ -428,75 +2458,76 @@ def merge(configuration):
     # Currently used and obsolete requirement identifiers
     used_ids = IdFactory()
 
-    # Load main input and replace it with a list of lines
-    configuration["input"] = _load_file(configuration["input"])
+    # Main input is read twice: once for its traceability matrix, that is
+    # stored at its very end, then once for actual output
+    tokens = _replay_tokens(configuration["input"])
 
     # Load traceability matrix, if any
-    linked_ids = preprocess(configuration["input"])["traceability"]
+    additional_data = _preprocess_input(configuration, tokens)
+    linked_ids = additional_data["traceability"]
 
-    line_num = 0
-    for line in configuration["input"]:
-        line_num += 1
+    with RequirementLoader(configuration,
+                           additional_data["inclusions"]) as requirements:
+        _merge_tokens(tokens(), linked_ids, requirements, used_ids,
+                      configuration)
 
-        if line.startswith(TAG_IPR):
-            req_id = line[len(TAG_IPR):].lstrip()
-            used_ids.add(req_id)
+    # Keep track of all requirements ids, in case some of them disappear
+    # during editing
+    for req_id in sorted(used_ids):
+        configuration["output"].write("{} {}\n".format(TAG_RRI, req_id))
+
+
+def _merge_tokens(tokens, linked_ids, requirements, used_ids, configuration):
+    for token in tokens:
+        kind = token.kind
+
+        if kind == TOKEN_TXT:
+            configuration["output"].write(token.line + "\n")
+
+        elif kind == TAG_IPR:
+            req_id = token.value.lstrip()
+            used_ids.add(req_id, kind, token.line_num)
 
             configuration["output"].write("{} {}\n".format(TAG_BRB, req_id))
 
-            if req_id in linked_ids:
-                ref_ids = sorted(linked_ids[req_id])
-                if None in ref_ids:
-                    configuration["output"].write("{}\n".format(TAG_DRM))
-                else:
-                    for ref_id in sorted(linked_ids[req_id]):
-                        configuration["output"].write("{} {}\n".format(
-                            TAG_TRB, ref_id))
-
-            # Give higher priority to requirement management with directory
-            # than by file
-            if os.path.isdir(req_id):
-                requirement = Requirement.from_directory_content(
-                    os.path.join(configuration["input_root"], req_id))
+            if linked_ids.is_derived(req_id):
+                configuration["output"].write("{}\n".format(TAG_DRM))
             else:
-                requirement = Requirement.from_file_content(
-                    os.path.join(configuration["input_root"], req_id + ".prk"))
-            requirement.id = req_id
+                for ref_id in linked_ids.references(req_id):
+                    configuration["output"].write("{} {}\n".format(
+                        TAG_TRB, ref_id))
+
+            requirement = requirements.get(req_id)
 
             configuration["output"].write("{}\n".format(
                 requirement.as_inline_text()))
             configuration["output"].write("{}\n".format(TAG_ERB))
 
-        elif line.startswith(TAG_RRI):
-            req_id = line[len(TAG_RRI):].lstrip()
-            used_ids.add(req_id)
+        elif kind == TAG_RRI:
+            req_id = token.value.lstrip()
+            used_ids.add(req_id, kind, token.line_num)
 
-        elif line.startswith(TAG_LNK):
+        elif kind == TAG_LNK:
             pass
 
-        elif line.startswith(TAG_DLN):
+        elif kind == TAG_DLN:
             pass
 
         # Permissive transformations
-        elif line.startswith(TAG_BRB):
+        elif kind == TAG_BRB:
             if not configuration["permissive"]:
                 logging.warning(
                     "line {}: BRB tag should not be present in input".format(
-                        line_num))
+                        token.line_num))
             else:
                 pass
 
-        elif line.startswith(TAG_ERB):
+        elif kind == TAG_ERB:
             pass
 
         # Normal output
         else:
-            configuration["output"].write("{}\n".format(line))
-
-    # Keep track of all requirements ids, in case some of them disappear
-    # during editing
-    for req_id in sorted(used_ids):
-        configuration["output"].write("{} {}\n".format(TAG_RRI, req_id))
+            configuration["output"].write(token.line + "\n")
 
 
 ##############################################################################
@@ -510,74 +2541,146 @@ def split(configuration):
     - replace each BRB/ERB delimiter pair with corresponding IRB delimiter
     - replace all TRB delimiter with corresponding LNK one
     - remove all superfluous RRI delimiter
+
+    Input is read only once. Named requirements are output as soon as they
+    are read, whereas anonymous ones are set aside until all already used
+    requirement identifiers are known, that is at the end of input
     """
+    import concurrent.futures
 
     # Referenced identifiers by traceability
-    linked_ids = dict()
+    linked_ids = TraceabilityGraph()
 
     # Requirement identifiers actually used in current version of the document
     cited_ids = set()
 
-    # Load main input and replace it with a list of lines
-    configuration["input"] = _load_file(configuration["input"])
-
-    # Parse file in order to collect already used requirement identifiers,
-    # even obsolete ones
-    used_ids = preprocess(configuration["input"])["identifiers"]
+    # Already used requirement identifiers, even obsolete ones, are collected
+    # while file is being split
+    analysis = {
+        "identifiers": IdFactory(),
+        "inclusions": list(),
+        "sections": list(),
+        "structure": list(),
+        "traceability": TraceabilityGraph(),
+    }
+    used_ids = analysis["identifiers"]
     used_ids.configure(pattern=configuration["format"],
                        width=configuration["width"])
 
-    # Actually split the file
+    # Main output is spooled, as TAG_IPR delimiters of anonymous requirements
+    # can only be completed at the end
     output = configuration["output"]
-
-    def output_requirement(requirement, configuration, used_ids, cited_ids,
-                           linked_ids):
-        if configuration["storage"] == 0:
-            requirement.as_plain_text(configuration, used_ids)
+    text_spool = tempfile.TemporaryFile("w+t")
+    text_spool_size = 0
+
+    # Anonymous requirements, and index of their TAG_IPR line in text spool
+    requirement_spool = tempfile.TemporaryFile()
+    placeholders = list()
+
+    def output_line(line):
+        nonlocal text_spool_size
+
+        text_spool.write(line + "\n")
+        text_spool_size += 1
+
+    # Requirements are actually stored by a pool of threads. Pending writes
+    # are bounded, in order not to keep too many requirements in memory
+    jobs = max(1, configuration.get("jobs", 1))
+    writer = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    writes = collections.deque()
+    written = 0
+
+    def wait_for_write():
+        nonlocal written
+
+        if writes.popleft().result():
+            written += 1
+
+    # Archive is read even when storing in another mode, in order to remove
+    # requirements from it
+    archive = RequirementArchive(configuration["output_root"])
+
+    def store_requirement(requirement, references):
+        if requirement.id is None:
+            requirement.id = used_ids.generate(
+                requirement.get_field_as_block("text"))
+        if configuration.get("reflow") is not None:
+            requirement = requirement.reflowed(configuration["reflow"])
+
+        if configuration["storage"] == 2:
+            archive.store(requirement)
+        elif configuration["storage"] == 0:
+            writes.append(
+                writer.submit(requirement.as_plain_text, configuration,
+                              used_ids))
         else:
-            requirement.as_directory(configuration, used_ids)
+            writes.append(
+                writer.submit(requirement.as_directory, configuration,
+                              used_ids))
+        while len(writes) > 2 * jobs:
+            wait_for_write()
+
         cited_ids.add(requirement.id)
-        linked_ids[requirement.id] = references
+        for ref_id in references:
+            if ref_id is None:
+                linked_ids.set_derived(requirement.id)
+            else:
+                linked_ids.add_link(requirement.id, ref_id)
+
+    def output_requirement(requirement, fields, references):
+        for field, lines in fields.items():
+            requirement[field] = lines
 
-        configuration["output"].write("{} {}\n".format(TAG_IPR,
-                                                       requirement.id))
+        if requirement.id is None:
+            pickle.dump((requirement, references), requirement_spool)
+            placeholders.append(text_spool_size)
+            output_line(TAG_IPR)
+        else:
+            store_requirement(requirement, references)
+            output_line("{} {}".format(TAG_IPR, requirement.id))
 
     requirement = None
     field = "text"
     require_etb = 0  # 3-state variable (0: no, 1: maybe, 2: yes)
 
-    line_num = 0
-    for line in configuration["input"]:
-        line_num += 1
+    for token in analyze(tokenize(configuration["input"]), analysis):
+        kind = token.kind
+        line = token.line
+        line_num = token.line_num
 
-        if line.startswith(TAG_BRB):
+        if kind == TAG_BRB:
             if requirement is not None:
-                output_requirement(requirement, configuration, used_ids,
-                                   cited_ids, linked_ids)
+                output_requirement(requirement, fields, references)
 
+            # Lines of fields are only turned into blocks once complete
             requirement = Requirement()
+            fields = {"text": list()}
             field = "text"
             require_etb = 0
-            requirement.id = _isolate_id(line, line_num)
+            requirement.id = _isolate_id(token)
             references = set()
 
-        elif line.startswith(TAG_ERB):
-            output_requirement(requirement, configuration, used_ids, cited_ids,
-                               linked_ids)
-            requirement = None
+        elif kind == TAG_ERB:
+            if requirement is None:
+                logging.warning(
+                    "line {}: ERB tag outside of any requirement block".format(
+                        line_num))
+            else:
+                output_requirement(requirement, fields, references)
+                requirement = None
 
-        elif line.startswith(TAG_TRB):
+        elif kind == TAG_TRB:
             if requirement is None:
                 logging.warning(
                     "line {}: TRB tag outside of any requirement block".format(
                         line_num))
             else:
-                ref_id = line[len(TAG_TRB):].lstrip()
+                ref_id = token.value.lstrip()
                 references.add(ref_id)
                 field = "text"
                 require_etb = 0
 
-        elif line.startswith(TAG_DRM):
+        elif kind == TAG_DRM:
             if requirement is None:
                 logging.warning(
                     "line {}: DRM tag outside of any requirement block".format(
@@ -587,32 +2690,32 @@ def split(configuration):
                 field = "text"
                 require_etb = 0
 
-        elif line.startswith(TAG_BTB):
+        elif kind == TAG_BTB:
             if requirement is None:
                 logging.warning(
                     "line {}: TAG tag outside of any requirement block".format(
                         line_num))
             else:
-                m = re.match(r"{}\s+(\S+)\s*(.*)".format(TAG_BTB), line)
+                m = _FIELD_REGEX.match(token.value)
                 if not m:
                     logging.warning(
                         "line {}: TAG requires an identifier right after it".
                         format(line_num))
                 else:
                     field = m.group(1)
-                    if field in requirement:
+                    if field in fields:
                         logging.warning(
                             "line {}: TAG {!r} is present twice in requirement"
                             .format(line_num, field))
 
                     if len(m.group(2)) == 0:
                         require_etb = 1  # maybe
-                        requirement[field] = list()
+                        fields[field] = list()
                     else:
                         require_etb = 0  # not required
-                        requirement[field] = [m.group(2)]
+                        fields[field] = [m.group(2)]
 
-        elif line.startswith(TAG_ETB):
+        elif kind == TAG_ETB:
             if requirement is None:
                 logging.warning(
                     "line {}: end of TAG tag outside of any requirement block".
@@ -621,53 +2724,205 @@ def split(configuration):
                 field = "text"
                 require_etb = 0
 
-        elif not line.startswith(TAG_RRI):
+        elif kind != TAG_RRI:
             if requirement is None:
-                output.write("{}\n".format(line))
+                output_line(line)
             elif field == "text":
-                requirement[field].append(line)
+                fields[field].append(line)
             else:
                 if require_etb == 2:
-                    requirement[field].append(line)
+                    fields[field].append(line)
                 elif require_etb == 1:
                     if len(line) == 0:
                         field = "text"
                     else:
-                        if len(requirement[field]) == 0:
+                        if len(fields[field]) == 0:
                             require_etb = 2
-                        requirement[field].append(line)
+                        fields[field].append(line)
                 else:  # require_etb == 0
                     if len(line) == 0:
                         field = "text"
                     else:
-                        requirement[field].append(line)
+                        fields[field].append(line)
 
     if requirement is not None:
-        output_requirement(requirement, configuration, used_ids, cited_ids,
-                           linked_ids)
+        output_requirement(requirement, fields, references)
+
+    # Every used identifier is now known: anonymous requirements can be given
+    # one, in order of appearance
+    requirement_spool.seek(0)
+    new_ids = dict()
+    for index in placeholders:
+        requirement, references = pickle.load(requirement_spool)
+        store_requirement(requirement, references)
+        new_ids[index] = requirement.id
+    requirement_spool.close()
+
+    while len(writes) > 0:
+        wait_for_write()
+    writer.shutdown()
+    logging.info("{} stored requirement(s) out of {} have been written".format(
+        written, len(cited_ids)))
+
+    # On demand, remove cited requirements that are also stored in another
+    # storage mode, as they could hide current ones while merging, and
+    # requirements no longer cited, from every storage mode. Those included
+    # by other documents of output directory are kept
+    if configuration.get("prune", False):
+        all_storages = {0, 1, 2}
+        other_storages = all_storages.difference([configuration["storage"]])
+        kept_ids = _ids_included_elsewhere(configuration)
+
+        for req_id in sorted(set(used_ids).union(cited_ids)
+                             .difference(kept_ids)):
+            if req_id in cited_ids:
+                storages = other_storages
+            else:
+                storages = all_storages
+            _remove_requirement(configuration, req_id, storages)
+            if 2 in storages:
+                archive.discard(req_id)
+
+    if archive.commit():
+        logging.info("Requirement archive has been written")
+    archive.close()
+
+    # Output main document
+    text_spool.seek(0)
+    for index, line in enumerate(text_spool):
+        if index in new_ids:
+            output.write("{} {}\n".format(TAG_IPR, new_ids[index]))
+        else:
+            output.write(line)
+    text_spool.close()
 
     # Keep memory only of unused requirement identifiers
     for req_id in sorted(set(used_ids).difference(cited_ids)):
         output.write("{} {}\n".format(TAG_RRI, req_id))
 
     # Keep memory of linked requirement identifiers
-    for req_id in sorted(linked_ids):
-        ref_ids = sorted(linked_ids[req_id])
-        if None in ref_ids:
+    for req_id, ref_ids in linked_ids.rows():
+        if linked_ids.is_derived(req_id):
             output.write("{} {}\n".format(TAG_DLN, req_id))
         else:
             for other_id in ref_ids:
                 output.write("{} {} {}\n".format(TAG_LNK, req_id, other_id))
 
 
-def _isolate_id(line, line_num):
-    result = line[len(TAG_BRB):].lstrip()
+def _ids_included_elsewhere(configuration):
+    """Identifiers of requirements included by the documents found in output
+    directory, other than input and output of current command
+    """
+    excluded = set()
+    for flow in [configuration["input"], configuration["output"]]:
+        name = getattr(flow, "name", None)
+        if isinstance(name, str):
+            excluded.add(os.path.realpath(name))
+
+    result = set()
+    for root, dirs, files in os.walk(configuration["output_root"]):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(".prk") or os.path.realpath(path) in excluded:
+                continue
+            with open(path, "rt") as input_file:
+                for line in input_file:
+                    if line.startswith(TAG_IPR):
+                        result.add(line[len(TAG_IPR):].strip())
+
+    return result
+
+
+def _replay_tokens(input_file):
+    """Make input file readable several times from its current position
+
+    Returned function yields input tokens from the beginning each time it is
+    called. A seekable input is read again at each call, so that memory usage
+    does not depend on document size. Other inputs (like pipes) are copied
+    as raw text first: in memory if they fit in a single chunk, in a spool
+    file otherwise, that is kept in memory only while it is small.
+    """
+    if not input_file.seekable():
+        read = functools.partial(input_file.read, 1 << 20)
+        chunk = read()
+        next_chunk = read() if len(chunk) > 0 else ""
+        if len(next_chunk) == 0:
+            input_file = io.StringIO(chunk, newline="")
+        else:
+            # A spool file is only needed by large inputs
+            spool = tempfile.SpooledTemporaryFile(
+                max_size=1 << 23, mode="w+t", encoding="utf-8",
+                errors="surrogatepass", newline="")
+            spool.write(chunk)
+            spool.write(next_chunk)
+            for chunk in iter(read, ""):
+                spool.write(chunk)
+            input_file = spool
+        input_file.seek(0)
+
+    start = input_file.tell()
+
+    def replay():
+        input_file.seek(start)
+        return tokenize(input_file)
+
+    return replay
+
+
+def _preprocess_input(configuration, tokens, complete=None, lines=False):
+    """preprocess() results of main input, from persistent cache if enabled
+
+    tokens is a function that returns main input tokens from its beginning.
+    Results already known (e.g. by 'serve' command) are given by
+    configuration["preprocessed"]. complete, if any, is called with results
+    before they are returned, to complete them (e.g. with indexes). It
+    returns True if it actually changed them, in which case they are cached
+    again. Line numbers of traceability are only kept if lines is True
+    """
+    if complete is None:
+        def complete(result):
+            return False
+
+    if configuration.get("preprocessed") is not None:
+        result = configuration["preprocessed"]
+        complete(result)
+        return result
+
+    input_file = configuration["input"]
+    if configuration.get("cache") is None or not input_file.seekable():
+        with Phase("preprocess"):
+            result = preprocess(tokens(), lines)
+        complete(result)
+        return result
+
+    cache = PreprocessCache(configuration["cache"],
+                            configuration.get("cache_size", 0))
+
+    start = input_file.tell()
+    key = cache.key(input_file, lines)
+    input_file.seek(start)
+
+    result = cache.get(key)
+    if result is None:
+        with Phase("preprocess"):
+            result = preprocess(tokens(), lines)
+        complete(result)
+        cache.put(key, result)
+    elif complete(result):
+        cache.put(key, result)
+
+    return result
+
+
+def _isolate_id(token):
+    result = token.value.lstrip()
 
     if len(result) == 0:
         result = None
     elif not re.match(IDENTIFIER_REGEX, result):
         logging.error("line {}: '{}' identifier is ill formed".format(
-            line_num, result))
+            token.line_num, result))
         result = None
 
     return result
@@ -679,12 +2934,18 @@ def _isolate_id(line, line_num):
 
 
 def usage(configuration):
-    print("""Usage: {cmd} boost|cross|merge|split|track|yield [OPTIONS] [FILE]
+    print("""Usage: {cmd} boost|cross|impact|merge|serve|split|track|yield \\
+[OPTIONS] [FILE]
        transform input FILE on standard output
 
 $> {cmd} split FILE > FILE.out
 search for each '{req}' mark and output it in a different file
 
+$> {cmd} split --prune FILE > FILE.out
+also remove copies of split requirements stored in another storage mode,
+and requirements no longer cited, unless another document of the directory
+includes them
+
 $> {cmd} merge FILE > FILE.out
 search for each '{inp}' mark and merge it with normal output
 
@@ -699,6 +2960,38 @@ output direct traceability matrix, one per of requirements per line
 
 $> {cmd} track FILE > FILE.out
 output all requirements referenced by the document, one per line
+
+$> {cmd} cross --format=jsonl|csv|tsv FILE > FILE.out
+output records, with line numbers (also for boost, impact and track). For
+yield, csv and tsv formats output matrices as csv-table directives
+
+$> {cmd} impact [--depends] -i FILE REQ-ID... > FILE.out
+output all requirements depending on given ones at any depth, one per line
+(or all those given ones depend on, with --depends)
+
+$> {cmd} yield --section=TITLE|--lines=FIRST:LAST FILE > FILE.out
+output only a section, or a range of lines, with the requirements it
+includes (matrices only deal with them)
+
+$> {cmd} split|yield --reflow=N FILE > FILE.out
+reflow text of requirements on N columns, paragraph by paragraph
+
+$> {cmd} yield --stats|--stats-json [--profile=FILE.prof] FILE > FILE.out
+report time of each phase, files read and written, and peak memory on
+standard error (and write cProfile data to FILE.prof)
+
+$> {cmd} yield --rev=REVISION FILE > FILE.out
+read FILE and its requirements as of a git revision, without checkout
+(also for merge, and for boost, cross, impact and track)
+
+$> {cmd} yield --watch -o FILE.out FILE
+render output again each time FILE or a requirement it includes changes
+
+$> {cmd} serve --socket=PATH
+answer requests over a Unix domain socket, keeping documents in memory
+
+$> {cmd} yield --workspace=DIR -o OUTDIR
+run command over each document found in DIR (or listed by a manifest file)
 """.format(cmd="prk", req=TAG_BRB, inp=TAG_IPR))
 
 
@@ -707,97 +3000,158 @@ output all requirements referenced by the document, one per line
 ##############################################################################
 
 
-def yield_cmd(configuration):
-    # Load main input and replace it with a list of lines
-    configuration["input"] = _load_file(configuration["input"])
+def yield_cmd(configuration):
+    if configuration.get("watch"):
+        return _watch_yield(configuration)
+
+    # Main input is read twice: once for its traceability matrix and its
+    # structure, then once for actual output
+    tokens = _replay_tokens(configuration["input"])
+
+    additional_data = _preprocess_input(configuration, tokens)
+    linked_ids = additional_data["traceability"]
+    structure = additional_data["structure"]
+    inclusions = additional_data["inclusions"]
+
+    # Only a section, or a range of lines, may be output
+    if "section" in configuration or "lines" in configuration:
+        selection = _select_lines(configuration, additional_data)
+        if selection is None:
+            return
+        first_line, last_line = selection
+
+        # Lines after the selected ones are not even read
+        tokens = list(itertools.islice(tokens(), first_line - 1, last_line))
+        inclusions = [token.value.split()[0] for token in tokens
+                      if token.kind == TAG_IPR]
+        tokens = functools.partial(iter, tokens)
+
+        # Matrices of a selection that includes requirements only deal with
+        # them, and its table of contents with its own sections
+        if len(inclusions) > 0:
+            linked_ids = linked_ids.restricted(inclusions)
+        structure = [(section.level, section.title)
+                     for section in additional_data["sections"]
+                     if first_line <= section.first_line and
+                     (last_line is None or section.first_line <= last_line)]
+
+    with RequirementLoader(configuration, inclusions) as requirements, \
+            Phase("render"):
+        _yield_tokens(tokens(), linked_ids, structure, requirements,
+                      configuration)
+
+
+def _select_lines(configuration, analysis):
+    """Range of lines to output, as the numbers of first and last lines
+    (last one being None for the end of document), given either by
+    configuration["section"] title or by configuration["lines"]. Returns
+    None if section is unknown
+    """
+    if "lines" in configuration:
+        return configuration["lines"]
+
+    title = configuration["section"]
+    sections = [section for section in analysis["sections"]
+                if section.title == title]
+    if len(sections) == 0:
+        logging.error("No section is titled '{}'".format(title))
+        return None
+    elif len(sections) > 1:
+        logging.warning(
+            "{} sections are titled '{}': the one at line {} is output".format(
+                len(sections), title, sections[0].first_line))
+
+    return sections[0].first_line, sections[0].last_line
+
 
-    additional_data = preprocess(configuration["input"])
-    linked_ids = additional_data["traceability"]
-    structure = additional_data["structure"]
+def _yield_tokens(tokens, linked_ids, structure, requirements, configuration):
+    for token in tokens:
+        kind = token.kind
 
-    line_num = 0
-    for line in configuration["input"]:
-        line_num += 1
-        if line.startswith(TAG_IPR):
-            req_id = line[len(TAG_IPR):].lstrip()
-
-            # Give higher priority to requirement management with directory
-            # than by file
-            if os.path.isdir(req_id):
-                requirement = Requirement.from_directory_content(
-                    os.path.join(configuration["input_root"], req_id))
-            else:
-                requirement = Requirement.from_file_content(
-                    os.path.join(configuration["input_root"], req_id + ".prk"))
-            requirement.id = req_id
+        if kind == TOKEN_TXT:
+            configuration["output"].write(token.line + "\n")
+
+        elif kind == TAG_IPR:
+            req_id = token.value.lstrip()
+
+            requirement = requirements.get(req_id)
+            if configuration.get("reflow") is not None:
+                requirement = requirement.reflowed(configuration["reflow"])
 
             req_content = requirement.as_inline_text()
             configuration["output"].write(
                 PUBLISH_FORMAT.format(req_id=req_id, req_content=req_content))
 
         # Traceability matrices
-        elif line.startswith(TAG_DTM):
-            _output_traceability_matrix(True, linked_ids, configuration)
+        elif kind == TAG_DTM:
+            with Phase("matrix"):
+                _output_traceability_matrix(True, linked_ids, configuration)
 
-        elif line.startswith(TAG_RTM):
-            _output_traceability_matrix(False, linked_ids, configuration)
+        elif kind == TAG_RTM:
+            with Phase("matrix"):
+                _output_traceability_matrix(False, linked_ids, configuration)
 
         # Table of contents
-        elif line.startswith(TAG_TOC):
+        elif kind == TAG_TOC:
             if len(structure) > 0:
                 _output_table_of_contents(structure, configuration)
 
         # Technical informations shall be removed from final document
-        elif line.startswith(TAG_RRI):
+        elif kind == TAG_RRI:
             pass
 
-        elif line.startswith(TAG_LNK):
+        elif kind == TAG_LNK:
             pass
 
-        elif line.startswith(TAG_DLN):
+        elif kind == TAG_DLN:
             pass
 
         # Permissive transformations
-        elif line.startswith(TAG_BRB):
+        elif kind == TAG_BRB:
             if not configuration["permissive"]:
                 logging.warning(
                     "line {}: BRB tag should not be present in input".format(
-                        line_num))
+                        token.line_num))
             else:
                 pass
 
-        elif line.startswith(TAG_ERB):
+        elif kind == TAG_ERB:
             pass
 
         # Normal output
         else:
-            configuration["output"].write("{}\n".format(line))
+            configuration["output"].write(token.line + "\n")
 
 
-def _output_traceability_matrix(is_direct, matrix, configuration):
-    derived_txt = "Derived requirement"
-
+def _output_traceability_matrix(is_direct, graph, configuration):
     if is_direct:
         header_key, header_value = "Requirement", "Reference"
         key_suffix, value_suffix = "_", ""
     else:
         header_value, header_key = "Requirement", "Reference"
         value_suffix, key_suffix = "_", ""
-        matrix = _transpose_matrix(matrix)
+
+    rows = _iterate_matrix_rows(is_direct, graph, configuration["sparse"])
+
+    # A CSV table needs no pass over data
+    output_format = configuration.get("output_format", "text")
+    if output_format in ["csv", "tsv"]:
+        _output_csv_table(header_key, header_value, rows, key_suffix,
+                          value_suffix, output_format, configuration)
+        return
+
+    rows = list(rows)
 
     # Determine formatting parameters
     key_length = len(header_key)
     value_length = len(header_value)
 
-    for key in matrix:
-        if configuration["sparse"] or len(matrix[key]) > 0:
-            if len(key + key_suffix) > key_length:
-                key_length = len(key + key_suffix)
-            for value in matrix[key]:
-                if value is None:
-                    value = derived_txt
-                if len(value + value_suffix) > value_length:
-                    value_length = len(value + value_suffix)
+    for key, values in rows:
+        if len(key + key_suffix) > key_length:
+            key_length = len(key + key_suffix)
+        for value in values:
+            if len(value + value_suffix) > value_length:
+                value_length = len(value + value_suffix)
 
     horizontal_line = "+" + ("-" * (key_length + 2)) \
         + "+" + ("-" * (value_length + 2)) + "+" + "\n"
@@ -811,27 +3165,12 @@ def _output_traceability_matrix(is_direct, matrix, configuration):
     output.write(formatting.format(key=header_key, value=header_value))
     output.write(horizontal_line)
 
-    for req_id in sorted(matrix):
-        values = sorted(matrix[req_id])
-
+    for req_id, values in rows:
         if len(values) == 0:
-            if configuration["sparse"]:
-                output.write(
-                    formatting.format(key=req_id + key_suffix, value=""))
-                output.write(horizontal_line)
-
-        elif len(values) == 1:
-            if values[0] is None:
-                txt = derived_txt
-            else:
-                txt = values[0]
-
-            output.write(
-                formatting.format(key=req_id + key_suffix,
-                                  value=txt + value_suffix))
+            output.write(formatting.format(key=req_id + key_suffix, value=""))
             output.write(horizontal_line)
 
-        else:  # if len(values) > 1:
+        else:
             output.write(
                 formatting.format(key=req_id + key_suffix,
                                   value=values[0] + value_suffix))
@@ -841,15 +3180,60 @@ def _output_traceability_matrix(is_direct, matrix, configuration):
             output.write(horizontal_line)
 
 
-def _transpose_matrix(matrix):
-    result = collections.defaultdict(set)
+def _iterate_matrix_rows(is_direct, graph, sparse):
+    """Rows of a traceability matrix, as pairs of an identifier and the list
+    of its linked identifiers. Empty rows are yielded only in sparse mode
+    """
+    derived_txt = "Derived requirement"
+
+    if is_direct:
+        for req_id, values in graph.rows():
+            if graph.is_derived(req_id):
+                values.insert(0, derived_txt)
+            if sparse or len(values) > 0:
+                yield req_id, values
+    else:
+        yield from graph.rows(forward=False)
+
+
+def _output_csv_table(header_key, header_value, rows, key_suffix,
+                      value_suffix, output_format, configuration):
+    """Output a traceability matrix as a reST csv-table directive
+    """
+    import csv
 
-    for key in matrix:
-        for value in matrix[key]:
-            if value is not None:
-                result[value].add(key)
+    output = configuration["output"]
 
-    return result
+    output.write(".. csv-table::\n")
+    output.write("   :header: \"{}\", \"{}\"\n".format(header_key,
+                                                       header_value))
+    if output_format == "tsv":
+        output.write("   :delim: tab\n")
+    output.write("\n")
+
+    # Rows are indented as directive content
+    writer = csv.writer(
+        _IndentedOutput(output, "   "),
+        delimiter="\t" if output_format == "tsv" else ",",
+        lineterminator="\n")
+    for key, values in rows:
+        if len(values) == 0:
+            writer.writerow([key + key_suffix, ""])
+        for i, value in enumerate(values):
+            writer.writerow([key + key_suffix if i == 0 else "",
+                             value + value_suffix])
+
+
+class _IndentedOutput(object):
+    """Output that indents each write, expected to be a whole line
+    """
+
+    def __init__(self, output, indentation):
+        self._output = output
+        self._indentation = indentation
+
+    def write(self, line):
+        return self._output.write(self._indentation + line)
 
 
 def _output_table_of_contents(structure, configuration):
@@ -863,6 +3247,565 @@ def _output_table_of_contents(structure, configuration):
     output.write("\n".join(entries))
 
 
+def _watch_yield(configuration):
+    """'yield' command in watch mode: output file is rendered again each time
+    main input, or one of the requirements it includes, changes
+
+    Runs until interrupted
+    """
+    global _SHARED_REQUIREMENTS
+
+    # Requirements are read again only if their files have changed
+    _SHARED_REQUIREMENTS = dict()
+
+    watcher = _YieldWatcher(configuration)
+    configuration["input"].close()
+    configuration["output"].discard()
+
+    try:
+        while True:
+            try:
+                if watcher.refresh():
+                    logging.info("Output '{}' rendered again".format(
+                        watcher.output_path))
+            except OSError as e:
+                logging.error(e)
+            time.sleep(configuration["watch_interval"])
+    except KeyboardInterrupt:
+        pass
+
+
+class _YieldWatcher(object):
+    """Rendered parts of 'yield' output, kept between renderings
+
+    Output is split into static parts, made of consecutive lines of main
+    input, and into dynamic ones: included requirements, traceability matrices
+    and tables of contents. A requirement is rendered again only if it has
+    changed, and a matrix or a table of contents only if the traceability or
+    the structure of main input has changed.
+    """
+
+    # Tokens whose rendering depends on more than main input lines
+    DYNAMIC_KINDS = [TAG_DTM, TAG_IPR, TAG_RTM, TAG_TOC]
+
+    def __init__(self, configuration):
+        self._configuration = dict(configuration)
+        self.input_path = configuration["input"].name
+        self.output_path = configuration["output"].name
+
+        self._signature = None
+        self._analysis = None
+        self._written = None
+
+        # Output parts, and dynamic ones as (index in parts, token) pairs
+        self._parts = list()
+        self._slots = list()
+
+        # Rendered dynamic parts, with what they have been rendered from
+        self._blocks = dict()
+        self._summaries = dict()
+
+    def refresh(self):
+        """Render again parts affected by changes since last call
+
+        Returns True if output file has been written
+        """
+        changed = self._refresh_input()
+
+        # Unique inclusions, in order. Once requirements have been read,
+        # checking their signatures is faster without prefetching threads
+        req_ids = list(dict.fromkeys(self._analysis["inclusions"]))
+        configuration = self._configuration
+        if len(self._blocks) > 0:
+            configuration = dict(configuration, prefetch=0)
+
+        # Requirements are all read at once: in the order of their storage
+        index = RequirementIndex(configuration["input_root"])
+        stored_ids = index.ordered(req_ids)
+        if len(stored_ids) == len(req_ids):
+            req_ids = stored_ids
+        with RequirementLoader(configuration, req_ids, index) as loader:
+            requirements = {req_id: loader.get(req_id) for req_id in req_ids}
+
+        for index, token in self._slots:
+            if token.kind == TAG_IPR:
+                req_id = token.value.lstrip()
+                source = requirements[req_id]
+                known = self._blocks.get(req_id)
+            else:
+                source = (self._analysis["traceability"],
+                          self._analysis["structure"])
+                known = self._summaries.get(token.kind)
+
+            if known is not None and (known[0] is source or
+                                      known[0] == source):
+                text = known[1]
+            else:
+                text = self._render([token], requirements)
+                if token.kind == TAG_IPR:
+                    self._blocks[req_id] = (source, text)
+                else:
+                    self._summaries[token.kind] = (source, text)
+
+            if self._parts[index] is not text:
+                self._parts[index] = text
+                changed = True
+
+        # Forget requirements that are no longer included
+        for req_id in set(self._blocks).difference(requirements):
+            del self._blocks[req_id]
+
+        if not changed:
+            return False
+        content = "".join(self._parts)
+        if content == self._written:
+            return False
+
+        # Output is written like the one of any command, compressed if asked
+        with OutputSink(self.output_path) as output:
+            output.write(content)
+        self._written = content
+
+        return True
+
+    def _refresh_input(self):
+        """Analyze main input again if it has changed, and split its output
+        into parts. Returns True if it has changed
+        """
+        stat = os.stat(self.input_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return False
+
+        with open(self.input_path, "rt") as input_file:
+            tokens = list(tokenize(input_file))
+        self._analysis = preprocess(iter(tokens))
+        self._signature = signature
+
+        self._parts = list()
+        self._slots = list()
+        lines = list()
+        for token in tokens:
+            if token.kind in self.DYNAMIC_KINDS:
+                self._parts.append(self._render(lines, None))
+                self._slots.append((len(self._parts), token))
+                self._parts.append(None)
+                lines = list()
+            else:
+                lines.append(token)
+        self._parts.append(self._render(lines, None))
+
+        return True
+
+    def _render(self, tokens, requirements):
+        configuration = dict(self._configuration)
+        configuration["output"] = io.StringIO()
+
+        _yield_tokens(tokens, self._analysis["traceability"],
+                      self._analysis["structure"], requirements,
+                      configuration)
+
+        return configuration["output"].getvalue()
+
+
+##############################################################################
+# 'serve' command implementation
+##############################################################################
+
+
+def run_server(default_configuration, user_configuration):
+    """Serve command answers requests over a Unix domain socket, keeping
+    documents and requirements in memory between requests
+
+    Each request is a JSON object on a single line, to which a JSON object is
+    answered on a single line as well:
+
+    - {"command": "boost"|"cross"|"merge"|"track"|"yield", "input": PATH}
+      answers {"status": "ok"|"error", "messages": [...], "output": TEXT}.
+      "sparse" and "permissive" members override configuration;
+    - {"command": "impact", "input": PATH, "ids": [...]} answers the same
+      way, "depends" member overriding configuration;
+    - {"command": "allocate", "input": PATH, "text": TEXT} reserves a new
+      identifier for a requirement of the document, and answers it in an "id"
+      member;
+    - {"command": "shutdown"} stops the server.
+
+    Returns the exit status
+    """
+    global _SHARED_REQUIREMENTS
+
+    # Imported here, as only this command needs it
+    import socket
+
+    path = user_configuration.get("socket", default_configuration["socket"])
+
+    # Do not steal the socket of a running server
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            try:
+                client.connect(path)
+            except OSError:
+                os.remove(path)
+            else:
+                logging.critical(
+                    "A server is already listening on '{}'".format(path))
+                return 1
+
+    _SHARED_REQUIREMENTS = dict()
+
+    # Opened files cannot be shared between requests
+    default_configuration = dict(default_configuration)
+    for key in ["input", "output"]:
+        default_configuration.pop(key, None)
+
+    server = PrkServer(path, default_configuration, user_configuration)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        logging.info("Listening on '{}'".format(path))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+    return 0
+
+
+class PrkServer(object):
+    """Server of 'serve' command, that keeps state of served documents
+    """
+
+    COMMANDS = {
+        "boost": boost,
+        "cross": cross,
+        "impact": impact,
+        "merge": merge,
+        "track": track,
+        "yield": yield_cmd,
+    }
+
+    def __init__(self, path, default_configuration, user_configuration):
+        # Imported here, as only this command needs it
+        import socketserver
+
+        self._server = socketserver.ThreadingUnixStreamServer(
+            path, functools.partial(_handle_connection, self))
+        self._server.daemon_threads = True
+        self.server_address = self._server.server_address
+
+        self._default_configuration = default_configuration
+        self._user_configuration = user_configuration
+
+        # Requests are answered one at a time
+        self._lock = threading.Lock()
+        self._documents = dict()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+    def server_close(self):
+        self._server.server_close()
+
+    def answer(self, request):
+        result = dict()
+
+        with self._lock:
+            messages = _LogCollector()
+            logging.getLogger().addHandler(messages)
+            try:
+                command = request.get("command")
+                if command == "shutdown":
+                    threading.Thread(target=self.shutdown).start()
+                elif command == "allocate":
+                    document = self._get_document(request["input"])
+                    req_id = document.allocate(request["text"])
+                    result["id"] = req_id
+                elif command in self.COMMANDS:
+                    document = self._get_document(request["input"])
+                    result["output"] = document.run(self.COMMANDS[command],
+                                                    request)
+                else:
+                    logging.error("Unknown command '{}'".format(command))
+            except Exception as e:
+                logging.error("{}: {}".format(type(e).__name__, e))
+            finally:
+                logging.getLogger().removeHandler(messages)
+
+        result["status"] = "error" if messages.errors > 0 else "ok"
+        result["messages"] = messages.messages
+
+        return result
+
+    def _get_document(self, path):
+        path = os.path.abspath(path)
+
+        if path not in self._documents:
+            input_root = os.path.dirname(path)
+
+            configuration = dict(self._default_configuration)
+            configuration.update(load_static_configuration(input_root))
+            configuration.update(self._user_configuration)
+            configuration["input_root"] = input_root
+            configuration["output_root"] = input_root
+
+            self._documents[path] = _ServedDocument(path, configuration)
+
+        result = self._documents[path]
+        result.refresh()
+
+        return result
+
+
+class _ServedDocument(object):
+    """State kept by server about a document: its preprocess() results, and
+    the identifiers allocated for it by the server
+    """
+
+    def __init__(self, path, configuration):
+        self._path = path
+        self._configuration = configuration
+        self._signature = None
+        self._analysis = None
+        self._allocated_ids = set()
+
+    def refresh(self):
+        """Analyze document again if it has changed
+        """
+        stat = os.stat(self._path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        if signature != self._signature:
+            with open(self._path, "rt") as input_file:
+                self._analysis = preprocess(tokenize(input_file), lines=True)
+
+            identifiers = self._analysis["identifiers"]
+            identifiers.configure(pattern=self._configuration["format"],
+                                  width=self._configuration["width"])
+            identifiers.update(self._allocated_ids)
+
+            self._signature = signature
+
+    def allocate(self, text):
+        result = self._analysis["identifiers"].generate(text)
+        self._allocated_ids.add(result)
+
+        return result
+
+    def run(self, command, request):
+        configuration = dict(self._configuration)
+        for option in ["depends", "permissive", "sparse"]:
+            if option in request:
+                configuration[option] = bool(request[option])
+        configuration["ids"] = list(request.get("ids", list()))
+        configuration["preprocessed"] = self._analysis
+
+        with open(self._path, "rt") as input_file:
+            configuration["input"] = input_file
+            configuration["output"] = io.StringIO()
+            command(configuration)
+
+        return configuration["output"].getvalue()
+
+
+def _handle_connection(server, connection, client_address, socket_server):
+    """Answer requests of a client of server, until it disconnects
+    """
+    # Imported here, as only 'serve' command needs it
+    import json
+
+    with connection.makefile("rb") as requests:
+        for line in requests:
+            try:
+                request = json.loads(line.decode("utf-8"))
+                if not isinstance(request, dict):
+                    raise ValueError("request shall be a JSON object")
+            except ValueError as e:
+                response = {"status": "error", "messages": [str(e)]}
+            else:
+                response = server.answer(request)
+
+            connection.sendall((json.dumps(response) + "\n").encode("utf-8"))
+
+
+##############################################################################
+# Workspace mode implementation
+##############################################################################
+
+
+def run_workspace(default_configuration, user_configuration):
+    """Run a command over every document of a workspace, on a pool of
+    processes
+
+    Output of each document is written in output root directory, at the same
+    relative path than the document, with a suffix specific to the command.
+    Returns the exit status: 0 if command succeeded for every document, 1
+    otherwise
+    """
+    import concurrent.futures
+
+    suffixes = {
+        boost: ".boost",
+        cross: ".cross",
+        merge: ".merge.rst",
+        track: ".track",
+        yield_cmd: ".yield.rst",
+    }
+
+    workspace = user_configuration["workspace"]
+    if os.path.isdir(workspace):
+        workspace_root = workspace
+    else:
+        workspace_root = os.path.dirname(workspace)
+    output_root = user_configuration.get("output_root", workspace_root)
+    suffix = suffixes[user_configuration["command"]]
+
+    # Opened files cannot be shared with other processes
+    default_configuration = dict(default_configuration)
+    for key in ["input", "output"]:
+        default_configuration.pop(key, None)
+
+    result = 0
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=user_configuration.get(
+                "jobs", default_configuration["jobs"]),
+            initializer=_initialize_workspace_worker) as executor:
+        futures = list()
+        for document in iterate_workspace_documents(workspace):
+            output_path = os.path.join(
+                output_root,
+                os.path.splitext(os.path.relpath(document, workspace_root))[0]
+                + suffix)
+            futures.append((document,
+                            executor.submit(_process_document,
+                                            default_configuration,
+                                            user_configuration, document,
+                                            output_path)))
+
+        for document, future in futures:
+            if not future.result():
+                logging.error("'{}' has not been processed correctly".format(
+                    document))
+                result = 1
+
+    return result
+
+
+def iterate_workspace_documents(workspace):
+    """Iterates in order over the documents of a workspace
+
+    A workspace is either a manifest file, that lists document paths one per
+    line (relatively to its own directory), or a directory. In the latter
+    case, documents are the '.prk' files that include or remember at least one
+    requirement.
+    """
+    result = list()
+
+    if os.path.isdir(workspace):
+        for root, dirs, files in os.walk(workspace):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".prk") and _is_document(path):
+                    result.append(path)
+    else:
+        with open(workspace, "rt") as manifest:
+            for line in manifest:
+                line = line.strip()
+                if len(line) > 0 and not line.startswith("#"):
+                    result.append(
+                        os.path.join(os.path.dirname(workspace), line))
+
+    return sorted(result)
+
+
+def _is_document(path):
+    with open(path, "rt") as input_file:
+        for line in input_file:
+            if line.startswith(TAG_IPR) or line.startswith(TAG_RRI):
+                return True
+
+    return False
+
+
+def _initialize_workspace_worker():
+    global _SHARED_REQUIREMENTS
+
+    _SHARED_REQUIREMENTS = dict()
+
+
+@functools.lru_cache(maxsize=None)
+def _formatter():
+    """formatter.py module, installed along this script, or None if it is
+    missing. It is loaded from its path, as the standard library of Python
+    up to 3.9 has a formatter module of its own
+    """
+    if not os.path.isfile(FORMATTER_PATH):
+        return None
+
+    spec = importlib.util.spec_from_file_location("formatter",
+                                                  FORMATTER_PATH)
+    result = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(result)
+
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _load_static_configuration_once(input_root):
+    return load_static_configuration(input_root)
+
+
+def _process_document(default_configuration, user_configuration, document,
+                      output_path):
+    """Run a command over a single document of a workspace
+
+    Returns True if no error has been reported
+    """
+    input_root = os.path.dirname(document)
+
+    configuration = dict(default_configuration)
+    configuration.update(_load_static_configuration_once(input_root))
+    configuration.update(user_configuration)
+    configuration["input_root"] = input_root
+    configuration["output_root"] = os.path.dirname(output_path)
+
+    messages = _LogCollector()
+    logging.getLogger().addHandler(messages)
+    try:
+        os.makedirs(configuration["output_root"], exist_ok=True)
+        with open(document, "rt") as input_file, \
+                OutputSink(output_path) as output_file:
+            configuration["input"] = input_file
+            configuration["output"] = output_file
+            configuration["command"](configuration)
+    except Exception as e:
+        logging.error("{}: {}".format(document, e))
+    finally:
+        logging.getLogger().removeHandler(messages)
+
+    return messages.errors == 0
+
+
+class _LogCollector(logging.Handler):
+    """Logging handler that collects warnings and errors, and counts the
+    latter
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = list()
+        self.errors = 0
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+        if record.levelno >= logging.ERROR:
+            self.errors += 1
+
+
 # Other functions
 
 
@@ -874,15 +3817,20 @@ def load_user_configuration(tokens):
 
     # Parse command name
     if len(tokens) < 1:
-        logging.critical("A command (among 'boost', 'merge', 'split', " +
-                         "'track' or 'yield') shall be provided")
+        logging.critical("A command (among 'boost', 'impact', 'merge', " +
+                         "'serve', 'split', 'track' or 'yield') shall be " +
+                         "provided")
         error_encountered = True
     elif tokens[0] == "boost":
         result["command"] = boost
     elif tokens[0] == "cross":
         result["command"] = cross
+    elif tokens[0] == "impact":
+        result["command"] = impact
     elif tokens[0] == "merge":
         result["command"] = merge
+    elif tokens[0] == "serve":
+        result["command"] = run_server
     elif tokens[0] == "split":
         result["command"] = split
     elif tokens[0] == "track":
@@ -891,8 +3839,8 @@ def load_user_configuration(tokens):
         result["command"] = yield_cmd
     else:
         logging.critical("Unknown command - first argument shall either be " +
-                         "'boost', 'cross', 'merge', 'split', 'track' or " +
-                         "'yield'")
+                         "'boost', 'cross', 'impact', 'merge', 'serve', " +
+                         "'split', 'track' or 'yield'")
         error_encountered = True
 
     # Parse remaining tokens as options and arguments
@@ -901,18 +3849,71 @@ def load_user_configuration(tokens):
     if not error_encountered:
         try:
             opts, args = getopt.getopt(tokens[1:], "i:o:", [
-                "input=", "output=", "compact", "permissive", "quiet",
-                "sparse", "strict", "verbose"
+                "input=", "output=", "cache=", "compact", "depends",
+                "format=", "jobs=", "keep", "lines=", "no-cache",
+                "permissive", "prefetch=", "profile=", "prune", "quiet",
+                "reflow=", "rev=", "section=", "socket=", "sparse", "stats",
+                "stats-json", "storage=", "strict", "verbose", "watch",
+                "workspace="
             ])
         except getopt.GetoptError as e:
             logging.error(e)
             error_encountered = True
 
-    # Any argument is taken as input
-    if not error_encountered:
+    # In workspace mode, documents are found in workspace, and output option
+    # gives a directory
+    for opt, val in opts:
+        if opt == "--workspace":
+            result["workspace"] = val
+    if "workspace" in result:
+        if result["command"] not in [boost, cross, merge, track, yield_cmd]:
+            logging.critical("Command '{}' has no workspace mode".format(
+                tokens[0]))
+            error_encountered = True
+        elif len(args) > 0:
+            logging.critical("No input shall be provided in workspace mode")
+            error_encountered = True
+
+    # Main input and requirements can be read from a git revision, instead
+    # of working tree
+    for opt, val in opts:
+        if opt == "--rev" and not error_encountered:
+            if "workspace" in result or result["command"] not in [
+                    boost, cross, impact, merge, track, yield_cmd]:
+                logging.critical("Command '{}' cannot read a git revision"
+                                 .format(tokens[0]))
+                error_encountered = True
+                continue
+
+            # Repository is the one of main input, whatever current
+            # directory is
+            input_paths = [v for o, v in opts if o in ["-i", "--input"]]
+            if result["command"] is not impact:
+                input_paths = args + input_paths
+            directory = None
+            if len(input_paths) > 0:
+                directory = os.path.dirname(input_paths[-1]) or None
+
+            if "revision" in result:
+                result.pop("revision").close()
+            try:
+                result["revision"] = GitRevision(val, directory)
+            except (OSError, ValueError) as e:
+                logging.critical(e)
+                error_encountered = True
+
+    # Any argument is taken as input, except for 'impact' command, whose
+    # arguments are requirement identifiers
+    if not error_encountered and result["command"] is impact:
+        if len(args) == 0:
+            logging.critical("At least one requirement identifier shall be " +
+                             "provided")
+            error_encountered = True
+        result["ids"] = args
+    elif not error_encountered:
         if len(args) == 1:
             try:
-                result["input"] = open(args[0], "rt")
+                result["input"] = _open_input(result, args[0])
                 result["input_root"] = os.path.dirname(args[0])
             except OSError as e:
                 logging.critical(e)
@@ -928,22 +3929,73 @@ def load_user_configuration(tokens):
         elif opt == "--compact":
             result["sparse"] = False
 
+        elif opt in ["-i", "--input"] and "workspace" in result:
+            logging.critical("No input shall be provided in workspace mode")
+            error_encountered = True
         elif opt in ["-i", "--input"]:
             try:
-                result["input"] = open(val, "rt")
+                result["input"] = _open_input(result, val)
                 result["input_root"] = os.path.dirname(val)
             except OSError as e:
                 logging.critical(e)
                 error_encountered = True
 
+        elif opt in ["-o", "--output"] and "workspace" in result:
+            result["output_root"] = val
         elif opt in ["-o", "--output"]:
+            if "output" in result:
+                result.pop("output").discard()
             try:
-                result["output"] = open(val, "wt")
+                result["output"] = OutputSink(val)
                 result["output_root"] = os.path.dirname(val)
             except OSError as e:
                 logging.critical(e)
                 error_encountered = True
 
+        elif opt == "--cache":
+            result["cache"] = val
+        elif opt == "--no-cache":
+            result["cache"] = None
+
+        elif opt == "--socket":
+            result["socket"] = val
+
+        elif opt == "--watch":
+            result["watch"] = True
+
+        elif opt == "--depends":
+            result["depends"] = True
+
+        elif opt == "--section":
+            result["section"] = val
+            result.pop("lines", None)
+        elif opt == "--lines":
+            m = re.match(r"^(\d*):(\d*)$", val)
+            first = int(m.group(1) or 1) if m else 0
+            last = int(m.group(2)) if m and m.group(2) else None
+            if first < 1 or (last is not None and last < first):
+                logging.critical("Range of lines shall be given as " +
+                                 "FIRST:LAST, not '{}'".format(val))
+                error_encountered = True
+            else:
+                result["lines"] = (first, last)
+                result.pop("section", None)
+
+        elif opt == "--stats":
+            result["stats"] = "text"
+        elif opt == "--stats-json":
+            result["stats"] = "json"
+
+        elif opt == "--profile":
+            result["profile"] = val
+
+        elif opt == "--format":
+            if val in ["csv", "jsonl", "text", "tsv"]:
+                result["output_format"] = val
+            else:
+                logging.critical("Unknown output format '{}'".format(val))
+                error_encountered = True
+
         elif opt == "--quiet":
             result["log_level"] = 0
 
@@ -956,44 +4008,171 @@ def load_user_configuration(tokens):
         elif opt == "--permissive":
             result["permissive"] = True
 
-    #
-    if error_encountered:
-        result["command"] = usage
+        elif opt == "--jobs":
+            try:
+                result["jobs"] = max(1, int(val))
+            except ValueError:
+                logging.critical(
+                    "Number of jobs shall be an integer, not '{}'".format(val))
+                error_encountered = True
 
-    return result
+        elif opt == "--storage":
+            if val in ["0", "1", "2"]:
+                result["storage"] = int(val)
+            else:
+                logging.critical("Unknown storage mode '{}'".format(val))
+                error_encountered = True
 
+        elif opt == "--prune":
+            result["prune"] = True
+        elif opt == "--keep":
+            result["prune"] = False
 
-def _load_file(input_file):
-    """Load file as a list of lines.
-    """
-    result = list()
+        elif opt == "--prefetch":
+            try:
+                result["prefetch"] = max(0, int(val))
+            except ValueError:
+                logging.critical(
+                    "Prefetch depth shall be an integer, not '{}'".format(val))
+                error_encountered = True
+
+        elif opt == "--reflow":
+            try:
+                result["reflow"] = max(1, int(val))
+            except ValueError:
+                logging.critical(
+                    "Reflow width shall be an integer, not '{}'".format(val))
+                error_encountered = True
+
+    # Records can be output in every format, whereas matrices of 'yield'
+    # command can only be output as reST tables
+    if not error_encountered:
+        if result["command"] in [boost, cross, impact, track]:
+            output_formats = ["csv", "jsonl", "text", "tsv"]
+        elif result["command"] is yield_cmd:
+            output_formats = ["csv", "text", "tsv"]
+        else:
+            output_formats = ["text"]
+
+        if result.get("output_format", "text") not in output_formats:
+            logging.critical("Format '{}' is not available for '{}'".format(
+                result["output_format"], tokens[0]))
+            error_encountered = True
 
-    if type(input_file) == type(str):
-        input_file = open(input_file, "rt")
+    # Only a single document can be partially yielded, once
+    if ("section" in result or "lines" in result) and not error_encountered:
+        if result["command"] is not yield_cmd or "workspace" in result \
+           or result.get("watch"):
+            logging.critical("Only 'yield' command can output a section " +
+                             "or a range of lines of a document")
+            error_encountered = True
+
+    # Only requirements that are split or yielded can be reflowed, by
+    # formatter.py
+    if "reflow" in result and not error_encountered:
+        if result["command"] not in [split, yield_cmd]:
+            logging.critical("Command '{}' cannot reflow requirements".format(
+                tokens[0]))
+            error_encountered = True
+        elif _formatter() is None:
+            logging.critical("Requirements cannot be reflowed: '{}' is not "
+                             "installed".format(FORMATTER_PATH))
+            error_encountered = True
+
+    # Statistics and profiling data are only gathered by a single process
+    if ("stats" in result or "profile" in result) and not error_encountered:
+        if "workspace" in result or result["command"] is run_server:
+            logging.critical("Statistics and profiling are only available " +
+                             "for a single document")
+            error_encountered = True
+
+    # Watch mode renders again an output file from an input file
+    if result.get("watch") and not error_encountered:
+        if result["command"] is not yield_cmd:
+            logging.critical("Command '{}' has no watch mode".format(
+                tokens[0]))
+            error_encountered = True
+        elif "input" not in result or "output" not in result:
+            logging.critical("Watch mode requires input and output files")
+            error_encountered = True
+        elif "revision" in result:
+            logging.critical("Watch mode cannot read a git revision")
+            error_encountered = True
 
-    for line in input_file:
-        result.append(line.rstrip())
+    # Output file is left unchanged if command cannot be run
+    if error_encountered:
+        if "output" in result:
+            result.pop("output").discard()
+        if "revision" in result:
+            result.pop("revision").close()
+        result["command"] = usage
+        for key in ["profile", "stats", "workspace"]:
+            result.pop(key, None)
 
     return result
 
 
-def load_static_configuration(input_root):
+def _open_input(configuration, path):
+    """Main input file, from configuration["revision"] if any, else from
+    working tree
+    """
+    if configuration.get("revision") is not None:
+        return configuration["revision"].open(path)
+    return open(path, "rt")
+
+
+def load_static_configuration(input_root, revision=None):
+    """Configuration read from the first configuration file found. The one of
+    input root directory is read from revision (a GitRevision), if any
+    """
     result = dict()
     config_file = configparser.RawConfigParser()
 
     # First, find adequate configuration file:
     for location in iterate_configuration_file_locations(input_root):
-        if os.path.exists(location):
+        if revision is not None and \
+           location == os.path.join(input_root, "prkrc.ini"):
+            try:
+                config_file.read_string(revision.read_text(location),
+                                        location)
+            except FileNotFoundError:
+                continue
+        elif os.path.exists(location):
             config_file.read(location)
-            logging.info("Loaded configuration file: '{}'".format(location))
-            break
+        else:
+            continue
+        logging.info("Loaded configuration file: '{}'".format(location))
+        break
     else:
+        location = None
         logging.info("No configuration file is available.")
 
     # Then, read it
     for section in config_file:
-        if section == "merge":
-            pass
+        if section == "cache":
+            # Cache is stored in the cache directory of user, unless
+            # otherwise specified
+            result["cache"] = PreprocessCache.default_directory()
+            for option in config_file.options(section):
+                if option == "directory":
+                    result["cache"] = os.path.join(
+                        os.path.dirname(location),
+                        os.path.expanduser(config_file[section][option]))
+                elif option == "size":
+                    result["cache_size"] = int(config_file[section][option])
+                else:
+                    logging.warning(
+                        "Unknown option '{}' in '{}' section of" +
+                        " configuration file".format(option, section))
+
+        elif section == "merge":
+            for option in config_file.options(section):
+                if option == "prefetch":
+                    result["prefetch"] = int(config_file[section][option])
+                else:
+                    logging.warning(
+                        "Unknown option '{}' in '{}' section of" +
+                        " configuration file".format(option, section))
 
         elif section == "split":
             for option in config_file.options(section):
@@ -1001,8 +4180,17 @@ def load_static_configuration(input_root):
                     result["format"] = config_file[section][option]
                 elif option == "storage":
                     result["storage"] = int(config_file[section][option])
+                    if result["storage"] not in [0, 1, 2]:
+                        logging.error(
+                            "Unknown storage mode {}".format(
+                                result["storage"]))
+                        del result["storage"]
                 elif option == "width":
                     result["width"] = int(config_file[section][option])
+                elif option == "jobs":
+                    result["jobs"] = int(config_file[section][option])
+                elif option == "prune":
+                    result["prune"] = config_file[section].getboolean(option)
                 else:
                     logging.warning(
                         "Unknown option '{}' in '{}' section of" +
@@ -1014,6 +4202,11 @@ def load_static_configuration(input_root):
                     result["sparse"] = eval(config_file[section][option])
                 elif option == "compact":
                     result["sparse"] = not eval(config_file[section][option])
+                elif option == "prefetch":
+                    result["prefetch"] = int(config_file[section][option])
+                elif option == "interval":
+                    result["watch_interval"] = float(
+                        config_file[section][option])
                 else:
                     logging.warning(
                         "Unknown option '{}' in '{}' section of" +
@@ -1050,22 +4243,35 @@ if __name__ == "__main__":
 
     # Default configuration
     DEFAULT_CONFIGURATION = {
+        "cache": None,
+        "cache_size": 64 * 1024 * 1024,
         "command": usage,
         "format": "REQ-%N",
         "input": sys.stdin,
         "input_root": os.getcwd(),
+        "jobs": 8,
         "log_level": 1,
-        "output": sys.stdout,
+        "output": None,
         "output_root": os.getcwd(),
         "permissive": False,
+        "prefetch": 0,
+        "prune": False,
+        "socket": ".prk.sock",
         "sparse": False,
         "storage": 1,
         "strict": False,
+        "watch_interval": 1.0,
         "width": 4,
     }
 
     USER_CONFIGURATION = load_user_configuration(sys.argv[1:])
 
+    # Workspace mode and server run each document with its own configuration
+    if "workspace" in USER_CONFIGURATION:
+        sys.exit(run_workspace(DEFAULT_CONFIGURATION, USER_CONFIGURATION))
+    elif USER_CONFIGURATION.get("command") is run_server:
+        sys.exit(run_server(DEFAULT_CONFIGURATION, USER_CONFIGURATION))
+
     # This configuration can only be loaded once INPUT argument is known, but
     # its eventual effectual effects shall be applied prior to any
     # command-line argument!
@@ -1076,12 +4282,29 @@ if __name__ == "__main__":
     else:
         input_root = DEFAULT_CONFIGURATION["input_root"]
 
-    STATIC_CONFIGURATION = load_static_configuration(input_root)
+    STATIC_CONFIGURATION = load_static_configuration(
+        input_root, USER_CONFIGURATION.get("revision"))
 
     # Calculate actual configuration
     CONFIGURATION = dict(DEFAULT_CONFIGURATION)
     CONFIGURATION.update(STATIC_CONFIGURATION)
     CONFIGURATION.update(USER_CONFIGURATION)
+    if CONFIGURATION["output"] is None:
+        CONFIGURATION["output"] = OutputSink()
 
-    # Execute requested transformation
-    CONFIGURATION["command"](CONFIGURATION)
+    # Execute requested transformation. An output file is replaced only if
+    # it has completed
+    with Instrumentation(CONFIGURATION):
+        try:
+            CONFIGURATION["command"](CONFIGURATION)
+        except OSError as e:
+            CONFIGURATION["output"].discard()
+            logging.critical(e)
+            sys.exit(1)
+        except BaseException:
+            CONFIGURATION["output"].discard()
+            raise
+        CONFIGURATION["output"].close()
+
+    if CONFIGURATION.get("revision") is not None:
+        CONFIGURATION["revision"].close()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+
+"""Benchmarks of PeRKy commands over synthetic documents
+
+Each command is run in its own process, over documents of several sizes.
+Its best wall time and its peak memory are compared to the ones recorded
+in a baseline file: benchmark fails if any of them regresses beyond a
+threshold, tighter for large documents. Wall times are scaled by the speed
+of current machine, measured by a calibration workload run along
+benchmarks of each size, so that a baseline recorded on another machine
+(or while it was less loaded) remains meaningful.
+
+Traceability commands are also run over a document with many more links
+per requirement, and yield is also given its document through a pipe. The
+baseline is recorded with --update, by default with scripts of current
+tree; --prk and --formatter record it with other versions of them, e.g.
+the ones of a release extracted with 'git show'.
+
+Usage: benchmark.py [--sizes=N,...] [--repeat=N] [--threshold=RATIO]
+                    [--large-threshold=RATIO] [--memory-threshold=RATIO]
+                    [--baseline=FILE]
+                    [--prk=FILE] [--formatter=FILE] [--update]
+"""
+
+import getopt
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PRK = os.path.join(HERE, "..", "Src", "prk.py")
+FORMATTER = os.path.join(HERE, "..", "Src", "formatter.py")
+
+DEFAULT_BASELINE = os.path.join(HERE, "benchmark.json")
+DEFAULT_SIZES = [100, 1000, 5000]
+
+# Tolerated ratio of regression of wall time of small documents. Best
+# times of a few short runs still vary by a third on a loaded machine
+DEFAULT_THRESHOLD = 0.5
+
+# Tolerated ratio of regression of wall time from LARGE_SIZE requirements,
+# whose runs are long enough for their best times to be steadier, with no
+# slack
+DEFAULT_LARGE_THRESHOLD = 0.25
+LARGE_SIZE = 1000
+
+# Tolerated ratio of regression of peak memory, that hardly varies
+DEFAULT_MEMORY_THRESHOLD = 0.2
+
+# Tolerated regression of wall time of small documents in seconds, whatever
+# its ratio, as short runs are dominated by noise. It is kept below the
+# start-up time of prk.py, so that a slower start-up of every command is
+# caught
+TIME_SLACK = 0.02
+
+# Links per requirement of the document of traceability benchmarks
+DENSE_LINKS = 20
+
+WORDS = ["shall", "requirement", "system", "the", "of", "user", "data",
+         "output", "input", "document", "be", "able", "to", "each", "when",
+         "configuration", "error", "file", "identifier", "traceability"]
+
+
+def generate_corpus(root, requirements, links=None, fields=2, depth=3,
+                    directory_ratio=0.5, seed=0):
+    """Write a synthetic corpus in root directory:
+
+    - merged.prk: a document with requirement blocks, as input of 'split';
+    - doc.prk: the same document, with stored requirements, as input of
+      other commands. A directory_ratio of requirements are stored as
+      directories, the other ones as single files;
+    - text.txt: paragraphs of text, as input of formatter.
+
+    Requirements are given fields tagged fields, and links references to
+    upstream requirements (twice as many as requirements by default).
+    Headings are nested up to depth levels.
+    """
+    generator = random.Random(seed)
+    if links is None:
+        links = 2 * requirements
+
+    def sentence(length):
+        return " ".join(generator.choice(WORDS) for i in range(length))
+
+    req_ids = ["REQ-{:06d}".format(i) for i in range(requirements)]
+    ref_ids = ["UP-{:04d}".format(i) for i in range(max(1, links // 10))]
+
+    references = {req_id: set() for req_id in req_ids}
+    for i in range(links):
+        references[req_ids[i % requirements]].add(generator.choice(ref_ids))
+
+    underlines = "=-~^\"'"[:depth]
+    merged = list()
+    document = list()
+    for i, req_id in enumerate(req_ids):
+        # A new section every 10 requirements, at a random level
+        if i % 10 == 0:
+            title = sentence(3).capitalize()
+            underline = underlines[generator.randrange(depth)]
+            for output in [merged, document]:
+                output.extend([title, underline * len(title), ""])
+
+        requirement = {"text": [sentence(12), sentence(12)]}
+        for field in range(fields):
+            requirement["field{}".format(field)] = [sentence(4)]
+
+        merged.append("PRK-REQ {}".format(req_id))
+        for ref_id in sorted(references[req_id]):
+            merged.append("PRK-REF {}".format(ref_id))
+        merged.extend(requirement["text"])
+        for field in range(fields):
+            name = "field{}".format(field)
+            merged.append("PRK-TAG {} {}".format(name, requirement[name][0]))
+        merged.extend(["-- PRK-REQ", ""])
+
+        document.extend(["PRK-INC {}".format(req_id), ""])
+        if generator.random() < directory_ratio:
+            path = os.path.join(root, req_id)
+            os.makedirs(path)
+            for name, lines in requirement.items():
+                with open(os.path.join(path, name), "wt") as output_file:
+                    output_file.write("\n".join(lines))
+        else:
+            content = "\n".join(requirement["text"])
+            for field in range(fields):
+                name = "field{}".format(field)
+                content += "\n\nPRK-TAG {} {}".format(name,
+                                                      requirement[name][0])
+            with open(os.path.join(root, req_id + ".prk"),
+                      "wt") as output_file:
+                output_file.write(content + "\n")
+
+    document.extend(["PRK-TOC", "", "PRK-MTX", "", "PRK-XTM", ""])
+    for req_id in req_ids:
+        for ref_id in sorted(references[req_id]):
+            document.append("PRK-LNK {} {}".format(req_id, ref_id))
+
+    with open(os.path.join(root, "merged.prk"), "wt") as output_file:
+        output_file.write("\n".join(merged) + "\n")
+    with open(os.path.join(root, "doc.prk"), "wt") as output_file:
+        output_file.write("\n".join(document) + "\n")
+    with open(os.path.join(root, "text.txt"), "wt") as output_file:
+        for i in range(requirements):
+            output_file.write("\n".join(sentence(12) for j in range(4)))
+            output_file.write("\n\n")
+
+
+def generate_corpus_apart(root, requirements, links=None):
+    """generate_corpus(), run in a separate process
+
+    A command run by this process inherits its peak memory, which is thus
+    kept below the one of any command
+    """
+    subprocess.run([sys.executable, "-c",
+                    "import benchmark; benchmark.generate_corpus"
+                    "({!r}, {!r}, {!r})".format(root, requirements, links)],
+                   cwd=HERE, check=True)
+
+
+def measure(arguments, cwd, input_path=None, env=None):
+    """Run a command, and return its wall time in seconds and its peak
+    memory in kilobytes. Content of input_path file, if any, is written to
+    its standard input through a pipe
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(arguments, cwd=cwd, env=env,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL,
+                               stdin=(subprocess.DEVNULL if input_path is None
+                                      else subprocess.PIPE))
+    if input_path is not None:
+        with open(os.path.join(cwd, input_path), "rb") as input_file:
+            try:
+                shutil.copyfileobj(input_file, process.stdin)
+            except BrokenPipeError:
+                pass
+        process.stdin.close()
+    pid, status, usage = os.wait4(process.pid, 0)
+    duration = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise RuntimeError("'{}' failed with status {}".format(
+            " ".join(arguments), process.returncode))
+
+    return duration, usage.ru_maxrss
+
+
+def calibrate():
+    """Wall time of a fixed workload, in order to compare machines
+    """
+    workload = "sorted(str(i * 7919 % 100003) for i in range(200000))"
+    return measure([sys.executable, "-c", workload], HERE)[0]
+
+
+def run_benchmarks(sizes, repeat, prk=PRK, formatter=FORMATTER):
+    """Calibration times of current machine, by size, and results of every
+    benchmark, by name, running prk and formatter scripts
+    """
+    # (arguments, document given through a pipe, corpus) by benchmark name
+    commands = {
+        "split": (["split", "-o", "split/doc.prk", "merged.prk"], None, "."),
+        "merge": (["merge", "-o", "merge.out", "doc.prk"], None, "."),
+        "yield": (["yield", "-o", "yield.out", "doc.prk"], None, "."),
+        "yield-pipe": (["yield", "-o", "yield.out"], "doc.prk", "."),
+        "cross": (["cross", "-o", "cross.out", "doc.prk"], None, "."),
+        "cross-dense": (["cross", "-o", "cross.out", "doc.prk"], None,
+                        "dense"),
+        "boost-dense": (["boost", "-o", "boost.out", "doc.prk"], None,
+                        "dense"),
+        "track-dense": (["track", "-o", "track.out", "doc.prk"], None,
+                        "dense"),
+    }
+
+    # Scripts are run as modules, from bytecode compiled beforehand, as
+    # installed ones are: compiling a whole script on each run would hide
+    # the cost of commands themselves
+    subprocess.run([sys.executable, "-m", "py_compile", prk, formatter],
+                   check=True)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1",
+               PYTHONPATH=os.pathsep.join([os.path.dirname(prk),
+                                           os.path.dirname(formatter)]))
+
+    def module(script):
+        return [sys.executable, "-m",
+                os.path.splitext(os.path.basename(script))[0]]
+
+    def run(name, size, arguments, cwd, input_path=None, prepare=None):
+        if prepare is not None:
+            prepare()
+        duration, peak = measure(arguments, cwd, input_path, env)
+        result = results.setdefault("{}/{}".format(name, size),
+                                    {"time": duration, "memory": peak})
+        result["time"] = round(min(result["time"], duration), 4)
+        result["memory"] = max(result["memory"], peak)
+
+    calibrations = dict()
+    results = dict()
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            generate_corpus_apart(root, size)
+            os.mkdir(os.path.join(root, "dense"))
+            generate_corpus_apart(os.path.join(root, "dense"), size,
+                                  links=DENSE_LINKS * size)
+
+            # Split output is kept between runs: best time is the one of
+            # splitting again an unchanged document, which depends less on
+            # the state of file system than writing every requirement
+            os.mkdir(os.path.join(root, "split"))
+
+            # Benchmarks are run in turn, so that a slower period of the
+            # machine does not spoil every run of a single one. Machine is
+            # calibrated along with them, for the same reason
+            for i in range(repeat):
+                duration = calibrate()
+                calibrations[str(size)] = round(min(
+                    calibrations.get(str(size), duration), duration), 4)
+
+                for name, (arguments, input_path, corpus) in \
+                        commands.items():
+                    run(name, size, module(prk) + arguments,
+                        os.path.join(root, corpus), input_path)
+
+                # Formatter rewrites its input: it is given a fresh copy
+                # each time
+                run("formatter", size, module(formatter) + ["formatted.txt"],
+                    root,
+                    prepare=lambda: shutil.copy(
+                        os.path.join(root, "text.txt"),
+                        os.path.join(root, "formatted.txt")))
+
+    return calibrations, results
+
+
+def compare(baseline, calibrations, results, threshold, large_threshold,
+            memory_threshold):
+    """Print results against baseline, and return the number of regressions
+    """
+    regressions = 0
+    print("{:<20} {:>10} {:>10} {:>10} {:>10}".format(
+        "benchmark", "time (s)", "baseline", "mem (kB)", "baseline"))
+    for name, result in results.items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print("{:<20} {:>10.3f} {:>10} {:>10} {:>10}".format(
+                name, result["time"], "-", result["memory"], "-"))
+            continue
+
+        # Time of baseline, as if it had been measured on current machine
+        size = name.rsplit("/", 1)[-1]
+        expected_time = reference["time"] * (
+            calibrations[size] / baseline["calibration"][size])
+        if int(size) >= LARGE_SIZE:
+            allowed_time = expected_time * (1 + large_threshold)
+        else:
+            allowed_time = expected_time * (1 + threshold) + TIME_SLACK
+        status = ""
+        if result["time"] > allowed_time:
+            status += " TIME"
+        if result["memory"] > reference["memory"] * (1 + memory_threshold):
+            status += " MEMORY"
+        if len(status) > 0:
+            regressions += 1
+            status = " REGRESSION:" + status
+
+        print("{:<20} {:>10.3f} {:>10.3f} {:>10} {:>10}{}".format(
+            name, result["time"], expected_time, result["memory"],
+            reference["memory"], status))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    sizes = DEFAULT_SIZES
+    repeat = 10
+    threshold = DEFAULT_THRESHOLD
+    large_threshold = DEFAULT_LARGE_THRESHOLD
+    memory_threshold = DEFAULT_MEMORY_THRESHOLD
+    baseline_path = DEFAULT_BASELINE
+    prk = PRK
+    formatter = FORMATTER
+    update = False
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "", [
+            "baseline=", "formatter=", "large-threshold=", "memory-threshold=",
+            "prk=", "repeat=", "sizes=", "threshold=", "update"])
+        for opt, val in opts:
+            if opt == "--baseline":
+                baseline_path = val
+            elif opt == "--formatter":
+                formatter = os.path.abspath(val)
+            elif opt == "--large-threshold":
+                large_threshold = float(val)
+            elif opt == "--memory-threshold":
+                memory_threshold = float(val)
+            elif opt == "--prk":
+                prk = os.path.abspath(val)
+            elif opt == "--repeat":
+                repeat = max(1, int(val))
+            elif opt == "--sizes":
+                sizes = [int(size) for size in val.split(",")]
+            elif opt == "--threshold":
+                threshold = float(val)
+            elif opt == "--update":
+                update = True
+    except (getopt.GetoptError, ValueError) as e:
+        print(e, file=sys.stderr)
+        print(__doc__.split("\n\n")[-1], file=sys.stderr)
+        sys.exit(2)
+
+    calibrations, results = run_benchmarks(sizes, repeat, prk, formatter)
+
+    if update:
+        with open(baseline_path, "wt") as output_file:
+            json.dump({"calibration": calibrations, "results": results},
+                      output_file, indent=2, sort_keys=True)
+            output_file.write("\n")
+        print("Baseline '{}' has been updated".format(baseline_path))
+        sys.exit(0)
+
+    try:
+        with open(baseline_path, "rt") as input_file:
+            baseline = json.load(input_file)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+
+    regressions = compare(baseline, calibrations, results, threshold,
+                          large_threshold, memory_threshold)
+    if regressions > 0:
+        print("{} benchmark(s) regressed beyond {:.0%} ({:.0%} from {} "
+              "requirements) in time or {:.0%} in memory".format(
+                  regressions, threshold, large_threshold, LARGE_SIZE,
+                  memory_threshold))
+        sys.exit(1)
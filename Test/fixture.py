@@ -0,0 +1,30 @@
+"""Fixtures shared by PeRKy tests"""
+
+import os
+import tempfile
+import unittest
+
+
+class DirectoryTestCase(unittest.TestCase):
+    """Test case given a temporary directory, removed after each test, in
+    which fixture files are written
+    """
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def path(self, *names):
+        """Path of a file of the temporary directory"""
+        return os.path.join(self.root.name, *names)
+
+    def write(self, name, content):
+        """Write a fixture file, creating its directory if need be, and
+        return its path
+        """
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wt") as output_file:
+            output_file.write(content)
+
+        return path
@@ -0,0 +1 @@
+../Src/formatter.py
\ No newline at end of file
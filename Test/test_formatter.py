@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import unittest
+import unittest.mock
+
+import fixture
+import formatter
+import prk
+
+
+class TestReflow(fixture.DirectoryTestCase):
+
+    def test_paragraphs(self):
+        text = "  first   paragraph,\nindented\n\n\n\nsecond one \n"
+
+        self.assertEqual(formatter.reflow(text),
+                         "  first paragraph, indented\n\nsecond one\n")
+        self.assertEqual(formatter.reflow(io.StringIO(text), width=12),
+                         "  first\n  paragraph,\n  indented\n\nsecond one\n")
+
+    def test_items(self):
+        self.assertEqual(formatter.reflow("- one two three four", 10),
+                         "- one two\n  three\n  four\n")
+        self.assertEqual(formatter.reflow("12. one two three", 10),
+                         "12. one\n    two\n    three\n")
+
+    def test_long_word(self):
+        self.assertEqual(formatter.reflow("a " + "b" * 12 + " c", 10),
+                         "a\n" + "b" * 12 + "\nc\n")
+
+    def test_redistribute(self):
+        path = self.write("text.txt", "word " * 100 + "\n")
+
+        formatter.redistribute(path, width=20)
+
+        with open(path, "rt") as input_file:
+            lines = input_file.read().split("\n")
+        self.assertEqual(lines[0], "word word word word")
+        self.assertEqual(len(lines), 26)
+
+    def test_batch(self):
+        root = self.root.name
+        contents = {
+            "REQ-0001.prk": "Needs\nreflow\n",
+            "REQ-0002.prk": "Reflowed text\n",
+            os.path.join("REQ-0001", "text"): "Field,\nreflowed",
+        }
+        for name, content in contents.items():
+            self.write(name, content)
+
+        expected = [self.path("REQ-0001.prk"),
+                    self.path("REQ-0001", "text")]
+        self.assertEqual(formatter.redistribute_all([root], 20, check=True),
+                         (expected, []))
+        self.assertEqual(formatter.redistribute_all([root], 20, jobs=2),
+                         (expected, []))
+        self.assertEqual(formatter.redistribute_all([root], 20), ([], []))
+
+        with open(expected[1], "rt") as input_file:
+            self.assertEqual(input_file.read(), "Field, reflowed")
+
+    def test_mixed_directory(self):
+        contents = {
+            "REQ-0002.prk": "Needs\nreflow\n",
+            "REQ-0003.prk": "Text\n\nPRK-TAG status\nTo\nbe done\n",
+            "requirements.prk": "Some\ntext\nPRK-INC REQ-0002\n",
+            "prkrc.ini": "[split]\nstorage = 1\n",
+            "matrix.svg": "<svg\nwidth='1'>\n</svg>\n",
+            os.path.join("REQ-0001", "text"): "Field,\nreflowed",
+            os.path.join("REQ-0001", "data"): "Binary\n\0\nfield",
+        }
+        for name, content in contents.items():
+            self.write(name, content)
+
+        expected = [self.path("REQ-0002.prk"),
+                    self.path("REQ-0001", "text")]
+        self.assertEqual(formatter.redistribute_all([self.root.name], 20,
+                                                    jobs=1),
+                         (expected, []))
+
+        for name, content in contents.items():
+            if self.path(name) not in expected:
+                with open(self.path(name), "rt") as input_file:
+                    self.assertEqual(input_file.read(), content)
+
+    def test_requirement(self):
+        requirement = prk.Requirement()
+        requirement["text"] = ["one two", "three", ""]
+        requirement.id = "REQ-0001"
+
+        reflowed = requirement.reflowed(9)
+        self.assertEqual(reflowed.id, "REQ-0001")
+        self.assertEqual(reflowed.as_inline_text(), "one two\nthree")
+        self.assertEqual(requirement["text"], "one two\nthree")
+
+    def test_formatter_is_shipped_module(self):
+        # Not the formatter module of the standard library, if any
+        self.assertEqual(os.path.realpath(prk._formatter().__file__),
+                         os.path.realpath(formatter.__file__))
+
+    def test_missing_formatter(self):
+        self.write("doc.prk", "Title\n=====\n")
+        self.addCleanup(prk._formatter.cache_clear)
+        prk._formatter.cache_clear()
+
+        with unittest.mock.patch.object(prk, "FORMATTER_PATH",
+                                        self.path("formatter.py")):
+            with self.assertLogs(level="CRITICAL"):
+                configuration = prk.load_user_configuration(
+                    ["yield", "--reflow=60", self.path("doc.prk")])
+        self.addCleanup(configuration["input"].close)
+        self.assertIs(configuration["command"], prk.usage)
+
+
+if __name__ == "__main__":
+    unittest.main()
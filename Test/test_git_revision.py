@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import fixture
+import prk
+
+
+@unittest.skipIf(shutil.which("git") is None, "git is not available")
+class TestGitRevision(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.write("doc.prk", "Title\n=====\n\nPRK-INC REQ-0001\n\n"
+                   "PRK-INC REQ-0002\n")
+        self.write("REQ-0001.prk", "First requirement\n")
+        self.write(os.path.join("REQ-0002", "text"), "Second requirement")
+        self.write(os.path.join("REQ-0002", "note"), "A note")
+        self.git("init", "-q")
+        self.git("add", ".")
+        self.git("-c", "user.name=PeRKy", "-c", "user.email=prk@localhost",
+                 "commit", "-q", "-m", "Baseline")
+        self.git("tag", "v1")
+
+        # Working tree is no longer the one of the revision
+        self.write("REQ-0001.prk", "Amended requirement\n")
+        shutil.rmtree(self.path("REQ-0002"))
+
+        self.revision = prk.GitRevision("v1", self.root.name)
+        self.addCleanup(self.revision.close)
+
+    def git(self, *arguments):
+        subprocess.run(["git"] + list(arguments), cwd=self.root.name,
+                       check=True)
+
+    def test_read(self):
+        self.assertEqual(sorted(self.revision.list_directory(self.root.name)),
+                         [("REQ-0001.prk", False), ("REQ-0002", True),
+                          ("doc.prk", False)])
+        self.assertEqual(self.revision.read(self.path("REQ-0001.prk")),
+                         b"First requirement\n")
+        self.assertEqual(self.revision.read_text(self.path("REQ-0002/note")),
+                         "A note")
+
+        with self.assertRaises(FileNotFoundError):
+            self.revision.read(self.path("REQ-0003.prk"))
+        with self.assertRaises(FileNotFoundError):
+            self.revision.read(self.path("REQ-0002"))
+
+    def test_yield(self):
+        configuration = {
+            "input": self.revision.open(self.path("doc.prk")),
+            "input_root": self.root.name,
+            "output": io.StringIO(),
+            "permissive": False,
+            "prefetch": 2,
+            "revision": self.revision,
+            "sparse": False,
+            "storage": 1,
+        }
+        prk.yield_cmd(configuration)
+
+        output = configuration["output"].getvalue()
+        self.assertIn("First requirement", output)
+        self.assertIn("Second requirement\n\nPRK-TAG note A note", output)
+
+    def test_command_line(self):
+        self.write("prkrc.ini", "[split]\nwidth = 6\n")
+        self.git("add", "prkrc.ini")
+        self.git("-c", "user.name=PeRKy", "-c", "user.email=prk@localhost",
+                 "commit", "-q", "-m", "Configuration")
+        self.git("tag", "v2")
+        self.write("prkrc.ini", "[split]\nwidth = 8\n")
+
+        # Repository is found from input, not from current directory
+        elsewhere = tempfile.TemporaryDirectory()
+        self.addCleanup(elsewhere.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(elsewhere.name)
+
+        configuration = prk.load_user_configuration(
+            ["yield", "--rev=v2", self.path("doc.prk")])
+        self.addCleanup(configuration["revision"].close)
+        self.addCleanup(configuration["input"].close)
+
+        self.assertIn("PRK-INC REQ-0002", configuration["input"].read())
+        static_configuration = prk.load_static_configuration(
+            configuration["input_root"], configuration["revision"])
+        self.assertEqual(static_configuration["width"], 6)
+
+    def test_unknown_revision(self):
+        with self.assertRaises(ValueError):
+            prk.GitRevision("v2", self.root.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,6 +16,40 @@ class TestIdFactory(unittest.TestCase):
 
         self.assertTrue("Güt!")
 
+    def test_generate_is_deterministic(self):
+        factory = IdFactory()
+
+        self.assertEqual(factory.generate("requirement 0"), "REQ-4631")
+        self.assertEqual(factory.generate("requirement 0"), "REQ-6319")
+
+    def test_generate_with_pattern(self):
+        factory = IdFactory()
+        factory.configure(pattern="SRS-%N-%%", width=3)
+
+        self.assertEqual(factory.generate("requirement 0"), "SRS-463-%")
+
+    def test_generate_widens_when_full(self):
+        factory = IdFactory()
+        for i in range(9000):
+            factory.add("REQ-{:04d}".format(i))
+
+        self.assertEqual(len(factory.generate("requirement 0")), 9)
+
+    def test_registry(self):
+        factory = IdFactory()
+        factory.add("REQ-0002", "PRK-REQ", 12)
+        factory.update(["REQ-0001", "SRS-0001", "REQ-0010"], "PRK-MEM")
+        factory.add("REQ-0002", "PRK-MEM", 20)
+
+        self.assertIn("REQ-0010", factory)
+        self.assertNotIn("REQ-0003", factory)
+        self.assertEqual(len(factory), 4)
+        self.assertEqual(factory.origin("REQ-0002"), ("PRK-REQ", 12))
+        self.assertEqual(list(factory.range("REQ-0002", "REQ-0011")),
+                         ["REQ-0002", "REQ-0010"])
+        self.assertEqual(list(factory.with_prefix("REQ-000")),
+                         ["REQ-0001", "REQ-0002"])
+
 
 if __name__ == "__main__":
     unittest.main()
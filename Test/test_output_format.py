@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import unittest
+
+import prk
+
+DOCUMENT = """PRK-INC REQ-0001
+PRK-INC REQ-0002
+
+PRK-MTX
+
+PRK-LNK REQ-0001 UP-1
+PRK-LNK REQ-0001 UP-2
+PRK-DLN REQ-0002
+"""
+
+
+class TestOutputFormat(unittest.TestCase):
+
+    def run_command(self, command, output_format):
+        output = io.StringIO()
+        command({"input": io.StringIO(DOCUMENT), "output": output,
+                 "output_format": output_format, "sparse": False})
+
+        return output.getvalue()
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in
+                   self.run_command(prk.boost, "jsonl").splitlines()]
+
+        self.assertEqual(records, [
+            {"requirement": "REQ-0001", "line": 1, "derived": False},
+            {"requirement": "REQ-0002", "line": 2, "derived": True},
+        ])
+
+    def test_csv(self):
+        self.assertEqual(self.run_command(prk.cross, "csv"),
+                         "reference,requirement,line\n"
+                         "UP-1,REQ-0001,6\n"
+                         "UP-2,REQ-0001,7\n")
+        self.assertEqual(self.run_command(prk.track, "tsv"),
+                         "reference\tline\nUP-1\t6\nUP-2\t7\n")
+
+    def test_text(self):
+        self.assertEqual(self.run_command(prk.cross, "text"),
+                         "UP-1 REQ-0001\nUP-2 REQ-0001\n")
+
+    def test_lines_are_only_kept_on_demand(self):
+        graph = prk.preprocess(prk.tokenize(io.StringIO(DOCUMENT)))[
+            "traceability"]
+        self.assertIsNone(graph.line("REQ-0001"))
+        self.assertIsNone(graph.link_line("REQ-0001", "UP-1"))
+
+        graph = prk.preprocess(prk.tokenize(io.StringIO(DOCUMENT)),
+                               lines=True)["traceability"]
+        self.assertEqual(graph.line("REQ-0001"), 1)
+        self.assertEqual(graph.link_line("REQ-0001", "UP-1"), 6)
+
+    def test_csv_table(self):
+        output = io.StringIO()
+        graph = prk.preprocess(prk.tokenize(io.StringIO(DOCUMENT)))
+        prk._output_traceability_matrix(
+            True, graph["traceability"],
+            {"output": output, "output_format": "csv", "sparse": False})
+
+        self.assertEqual(output.getvalue(),
+                         ".. csv-table::\n"
+                         "   :header: \"Requirement\", \"Reference\"\n"
+                         "\n"
+                         "   REQ-0001_,UP-1\n"
+                         "   ,UP-2\n"
+                         "   REQ-0002_,Derived requirement\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import gzip
+import lzma
+import os
+import unittest
+
+import fixture
+import prk
+
+
+class TestOutputSink(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.output_path = self.write("output.rst", "Previous output\n")
+
+    def read(self):
+        with open(self.output_path, "rt") as input_file:
+            return input_file.read()
+
+    def test_atomic_replacement(self):
+        with prk.OutputSink(self.output_path) as output:
+            for i in range(100000):
+                output.write("Line {}\n".format(i))
+            self.assertEqual(self.read(), "Previous output\n")
+
+        self.assertTrue(self.read().endswith("Line 99999\n"))
+        self.assertEqual(os.listdir(self.root.name), ["output.rst"])
+
+    def test_discard(self):
+        with self.assertRaises(RuntimeError):
+            with prk.OutputSink(self.output_path) as output:
+                output.write("Partial output\n")
+                raise RuntimeError()
+
+        self.assertEqual(self.read(), "Previous output\n")
+        self.assertEqual(os.listdir(self.root.name), ["output.rst"])
+
+    def test_compression(self):
+        for suffix, module in [(".gz", gzip), (".xz", lzma)]:
+            path = self.output_path + suffix
+            with prk.OutputSink(path) as output:
+                output.write("Compressed output\n")
+
+            with module.open(path, "rt") as input_file:
+                self.assertEqual(input_file.read(), "Compressed output\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import io
+import marshal
+import os
+import unittest
+import unittest.mock
+
+import fixture
+import prk
+
+
+class TestPreprocessCache(fixture.DirectoryTestCase):
+
+    def test_round_trip(self):
+        cache = prk.PreprocessCache(self.root.name, 1 << 20)
+        document = io.StringIO("Title\n=====\n\nPRK-INC REQ-0001\n"
+                               "PRK-MEM REQ-0002\nPRK-LNK REQ-0001 UP-1\n")
+
+        key = cache.key(document)
+        self.assertIsNone(cache.get(key))
+
+        document.seek(0)
+        expected = prk.preprocess(prk.tokenize(document), lines=True)
+        cache.put(key, expected)
+        result = cache.get(key)
+        self.assertEqual(result["traceability"].references("REQ-0001"),
+                         ["UP-1"])
+        self.assertEqual(result["traceability"].link_line("REQ-0001",
+                                                          "UP-1"), 6)
+        self.assertEqual(result["traceability"], expected["traceability"])
+        self.assertEqual(result["inclusions"], ["REQ-0001"])
+        self.assertEqual(result["sections"], expected["sections"])
+        self.assertEqual(result["sections"][0].title, "Title")
+        self.assertEqual(result["identifiers"].origin("REQ-0002"),
+                         ("PRK-MEM", 5))
+
+        # Entries are plain data, whose loading runs no code
+        with open(self.path(key), "rb") as input_file:
+            self.assertIsInstance(marshal.load(input_file), dict)
+
+    def test_default_directory(self):
+        with unittest.mock.patch.dict(os.environ,
+                                      {"XDG_CACHE_HOME": self.root.name}):
+            self.assertEqual(prk.PreprocessCache.default_directory(),
+                             self.path("prk"))
+
+    def test_key_depends_on_content(self):
+        cache = prk.PreprocessCache(self.root.name, 1 << 20)
+
+        self.assertNotEqual(cache.key(io.StringIO("PRK-INC REQ-0001\n")),
+                            cache.key(io.StringIO("PRK-INC REQ-0002\n")))
+
+    def test_invalid_entry_that_cannot_be_removed(self):
+        cache = prk.PreprocessCache(self.root.name, 1 << 20)
+        self.write("key", "not marshal data")
+
+        with unittest.mock.patch("os.remove",
+                                 side_effect=PermissionError("read-only")):
+            with self.assertLogs(level="ERROR"):
+                self.assertIsNone(cache.get("key"))
+
+    def test_eviction(self):
+        cache = prk.PreprocessCache(self.root.name, 0)
+        cache.put("key", {"structure": list()})
+
+        self.assertEqual(os.listdir(self.root.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
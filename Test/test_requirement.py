@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import os
+import pickle
+import unittest
+
+import fixture
+import prk
+
+
+class TestRequirement(unittest.TestCase):
+
+    def setUp(self):
+        self.requirement = prk.Requirement()
+        self.requirement.id = "REQ-0001"
+
+    def test_blocks(self):
+        lines = ["", "First line  ", "", "Second line", "", ""]
+        self.requirement["text"] = lines
+        self.requirement["note"] = "\nA note \n"
+
+        self.assertEqual(self.requirement["text"],
+                         "First line\n\nSecond line")
+        self.assertEqual(lines[1], "First line  ")
+        self.assertEqual(self.requirement.as_inline_text(),
+                         "First line\n\nSecond line\n\nPRK-TAG note A note")
+
+    def test_compact(self):
+        self.assertFalse(hasattr(self.requirement, "__dict__"))
+
+        requirement = pickle.loads(pickle.dumps(self.requirement))
+        self.assertEqual(requirement, self.requirement)
+        self.assertEqual(requirement.id, "REQ-0001")
+
+
+class TestLazyRequirement(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        for field in ["attachment", "note", "text"]:
+            self.write(field, "Content of {}\n".format(field) * 10)
+
+        self.reads = list()
+        prk.add_hook(self.hook)
+        self.addCleanup(prk.remove_hook, self.hook)
+
+    def hook(self, event, name, value):
+        if event == "read":
+            self.reads.append(os.path.basename(name))
+
+    def test_lazy(self):
+        requirement = prk.Requirement.from_directory_content(self.root.name)
+
+        self.assertEqual(sorted(requirement),
+                         ["attachment", "note", "text"])
+        self.assertEqual(self.reads, [])
+
+        self.assertTrue(requirement["text"].startswith("Content of text"))
+        self.assertEqual(self.reads, ["text"])
+
+        requirement.load()
+        self.assertEqual(sorted(self.reads), ["attachment", "note", "text"])
+
+    def test_accessors(self):
+        requirement = prk.Requirement.from_directory_content(self.root.name)
+
+        self.assertTrue(requirement.get("note").startswith("Content of"))
+        self.assertIsNone(requirement.get("status"))
+        self.assertEqual(self.reads, ["note"])
+
+        for value in requirement.values():
+            self.assertIsInstance(value, str)
+        self.assertEqual(sorted(self.reads), ["attachment", "note", "text"])
+
+        requirement = prk.Requirement.from_directory_content(self.root.name)
+        self.assertTrue(requirement.pop("note").startswith("Content of"))
+        self.assertEqual(dict(requirement.items()),
+                         {field: requirement[field]
+                          for field in ["attachment", "text"]})
+
+    def test_memory_mapped(self):
+        prk.Requirement.MMAP_THRESHOLD = 100
+        self.addCleanup(setattr, prk.Requirement, "MMAP_THRESHOLD", 1 << 20)
+
+        eager = prk.Requirement.from_directory_content(self.root.name,
+                                                       lazy=False)
+        lazy = prk.Requirement.from_directory_content(self.root.name)
+        self.assertEqual(len(self.reads), 3)
+        self.assertEqual(eager, lazy)
+        self.assertEqual(eager["note"].count("\n"), 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
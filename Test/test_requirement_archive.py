@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+
+import fixture
+import prk
+
+
+class TestRequirementArchive(fixture.DirectoryTestCase):
+
+    def requirement(self, req_id, text):
+        result = prk.Requirement()
+        result.id = req_id
+        result["text"] = text.split("\n")
+        return result
+
+    def test_round_trip(self):
+        archive = prk.RequirementArchive(self.root.name)
+        archive.store(self.requirement("REQ-0002", "Second"))
+        archive.store(self.requirement("REQ-0001", "Fïrst\nrequirement"))
+        self.assertTrue(archive.commit())
+        archive.close()
+
+        archive = prk.RequirementArchive(self.root.name)
+        self.addCleanup(archive.close)
+        self.assertEqual(list(archive), ["REQ-0001", "REQ-0002"])
+        self.assertEqual(
+            archive.get("REQ-0001").get_field_as_block("text"),
+            "Fïrst\nrequirement")
+
+        # Nothing changes: nothing is written
+        self.assertFalse(archive.commit())
+
+    def test_fields(self):
+        requirement = self.requirement("REQ-0001", "Some text,\n\nin two "
+                                       "paragraphs")
+        requirement["status"] = "done"
+        requirement["note"] = ["First line,", "", "second paragraph"]
+        requirement["empty"] = ""
+
+        archive = prk.RequirementArchive(self.root.name)
+        archive.store(requirement)
+        archive.commit()
+        archive.close()
+
+        archive = prk.RequirementArchive(self.root.name)
+        self.addCleanup(archive.close)
+        stored = archive.get("REQ-0001")
+        self.assertEqual(stored, requirement)
+
+        # Fields are reflowed, not the delimiters that separate them
+        self.assertEqual(stored.reflowed(20).as_inline_text(),
+                         "Some text,\n\nin two paragraphs\n\n"
+                         "PRK-TAG empty\n\n"
+                         "PRK-TAG note\nFirst line,\n\nsecond paragraph\n"
+                         "-- PRK-TAG\n\n"
+                         "PRK-TAG status done")
+
+    def test_discard(self):
+        archive = prk.RequirementArchive(self.root.name)
+        archive.store(self.requirement("REQ-0001", "First"))
+        archive.commit()
+        archive.close()
+
+        archive = prk.RequirementArchive(self.root.name)
+        archive.discard("REQ-0001")
+        self.assertTrue(archive.commit())
+        archive.close()
+
+        self.assertEqual(os.listdir(self.root.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+import unittest
+
+import fixture
+import prk
+
+
+class TestRequirementLoader(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        for req_id in ["REQ-0001", "REQ-0002", "REQ-0003"]:
+            self.write(req_id + ".prk", "Text of {}\n".format(req_id))
+
+    def load(self, req_ids, prefetch, fields=True):
+        configuration = {"input_root": self.root.name, "prefetch": prefetch}
+
+        with prk.RequirementLoader(configuration, req_ids,
+                                   fields=fields) as loader:
+            return [loader.get(req_id) for req_id in req_ids]
+
+    def test_order(self):
+        req_ids = ["REQ-0003", "REQ-0001", "REQ-0002"]
+
+        for prefetch in [0, 1, 8]:
+            requirements = self.load(req_ids, prefetch)
+            self.assertEqual([r.id for r in requirements], req_ids)
+            self.assertEqual(requirements[0].get_field_as_block("text"),
+                             "Text of REQ-0003")
+
+    def test_repeated_inclusion_is_loaded_once(self):
+        requirements = self.load(["REQ-0001", "REQ-0002", "REQ-0001"], 2)
+
+        self.assertIs(requirements[0], requirements[2])
+
+    def test_missing_requirements_are_reported_at_once(self):
+        with self.assertRaises(FileNotFoundError) as context:
+            self.load(["REQ-0001", "REQ-0004", "REQ-0005"], 2)
+
+        self.assertIn("REQ-0004, REQ-0005", str(context.exception))
+
+    def test_index(self):
+        self.write(os.path.join("REQ-0002", "text"),
+                   "Stored as a directory\n")
+
+        index = prk.RequirementIndex(self.root.name)
+        self.assertTrue(index.is_directory("REQ-0002"))
+        self.assertFalse(index.is_directory("REQ-0001"))
+        self.assertEqual(sorted(index.ordered(["REQ-0003", "REQ-0004",
+                                               "REQ-0001"])),
+                         ["REQ-0001", "REQ-0003"])
+
+        requirement = self.load(["REQ-0002"], 0)[0]
+        self.assertEqual(requirement["text"], "Stored as a directory")
+
+    def test_prefetch_reads_fields(self):
+        for field in ["text", "note"]:
+            self.write(os.path.join("REQ-0004", field),
+                       "Content of {}\n".format(field))
+
+        reads = list()
+
+        def hook(event, name, value):
+            if event == "read":
+                reads.append((os.path.basename(name),
+                              threading.current_thread() is
+                              threading.main_thread()))
+
+        prk.add_hook(hook)
+        self.addCleanup(prk.remove_hook, hook)
+
+        # Fields are read by prefetching threads
+        requirement = self.load(["REQ-0004", "REQ-0001"], 2)[0]
+        self.assertIn(("note", False), reads)
+        self.assertIn(("text", False), reads)
+
+        # Fields are only read once accessed, if not needed ahead
+        del reads[:]
+        requirement = self.load(["REQ-0004", "REQ-0001"], 2, fields=False)[0]
+        self.assertNotIn(("note", False), reads)
+        self.assertEqual(requirement.get("note"), "Content of note")
+
+
+if __name__ == "__main__":
+    unittest.main()
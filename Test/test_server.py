@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import json
+import socket
+import threading
+import unittest
+
+import fixture
+import prk
+
+
+class TestServer(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.document = self.write("doc.prk",
+                                   "Title\n=====\n\nPRK-INC REQ-0001\n")
+        self.write("REQ-0001.prk", "First version\n")
+
+        configuration = {
+            "format": "REQ-%N",
+            "jobs": 1,
+            "permissive": False,
+            "prefetch": 0,
+            "sparse": False,
+            "storage": 1,
+            "strict": False,
+            "width": 4,
+        }
+        self.server = prk.PrkServer(self.path("prk.sock"), configuration,
+                                    dict())
+        self.addCleanup(self.server.server_close)
+
+    def test_yield_follows_changes(self):
+        request = {"command": "yield", "input": self.document}
+
+        response = self.server.answer(request)
+        self.assertEqual(response["status"], "ok")
+        self.assertIn("First version", response["output"])
+
+        self.write("REQ-0001.prk",
+                   "Second version, longer than the first one\n")
+
+        response = self.server.answer(request)
+        self.assertIn("Second version", response["output"])
+
+    def test_allocate(self):
+        request = {"command": "allocate", "input": self.document,
+                   "text": "requirement"}
+
+        first = self.server.answer(request)["id"]
+        second = self.server.answer(request)["id"]
+        self.assertNotEqual(first, second)
+        self.assertNotEqual(first, "REQ-0001")
+
+    def test_unknown_command(self):
+        response = self.server.answer({"command": "unknown"})
+        self.assertEqual(response["status"], "error")
+        self.assertEqual(len(response["messages"]), 1)
+
+    def test_socket(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(self.server.server_address)
+            flow = client.makefile("rwb")
+            flow.write(b"not JSON\n")
+            flow.write(json.dumps({"command": "shutdown"}).encode() + b"\n")
+            flow.flush()
+
+            self.assertEqual(json.loads(flow.readline())["status"], "error")
+            self.assertEqual(json.loads(flow.readline())["status"], "ok")
+
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import unittest
+
+import fixture
+import prk
+
+
+class TestSplit(fixture.DirectoryTestCase):
+
+    def split(self, text, storage=0):
+        configuration = {
+            "format": "REQ-%N",
+            "input": io.StringIO(text),
+            "output": io.StringIO(),
+            "output_root": self.root.name,
+            "storage": storage,
+            "width": 4,
+        }
+        prk.split(configuration)
+
+        return configuration["output"].getvalue()
+
+    def test_anonymous_id_avoids_later_ids(self):
+        # Without REQ-5874, first requirement would be given this identifier
+        output = self.split("PRK-REQ\n"
+                            "First anonymous requirement.\n"
+                            "-- PRK-REQ\n"
+                            "PRK-REQ REQ-5874\n"
+                            "Named one.\n"
+                            "-- PRK-REQ\n")
+
+        self.assertEqual(output, "PRK-INC REQ-8747\nPRK-INC REQ-5874\n")
+        self.assertEqual(sorted(os.listdir(self.root.name)),
+                         ["REQ-5874.prk", "REQ-8747.prk"])
+
+    def test_obsolete_ids_are_remembered(self):
+        output = self.split("Some text\n"
+                            "PRK-REQ REQ-0001\n"
+                            "Text\n"
+                            "PRK-REF UP-1\n"
+                            "-- PRK-REQ\n"
+                            "PRK-MEM REQ-0002\n")
+
+        self.assertEqual(
+            output, "Some text\n"
+            "PRK-INC REQ-0001\n"
+            "PRK-MEM REQ-0002\n"
+            "PRK-LNK REQ-0001 UP-1\n")
+
+    def test_unchanged_requirements_are_not_written(self):
+        text = "PRK-REQ REQ-0001\nText\n-- PRK-REQ\n"
+        self.split(text, storage=1)
+
+        path = self.path("REQ-0001", "text")
+        os.utime(path, (0, 0))
+        self.write(os.path.join("REQ-0001", "old"), "")
+
+        configuration = {
+            "format": "REQ-%N",
+            "input": io.StringIO(text + "PRK-MEM REQ-0002\n"),
+            "output": io.StringIO(),
+            "output_root": self.root.name,
+            "storage": 1,
+            "width": 4,
+        }
+        os.makedirs(self.path("REQ-0002"))
+        prk.split(configuration)
+
+        self.assertEqual(os.stat(path).st_mtime, 0)
+        self.assertEqual(sorted(os.listdir(self.root.name)),
+                         ["REQ-0001", "REQ-0002"])
+        self.assertEqual(
+            os.listdir(self.path("REQ-0001")), ["text"])
+
+    def test_rewritten_requirements_keep_their_permissions(self):
+        self.split("PRK-REQ REQ-0001\nText\n-- PRK-REQ\n")
+        path = self.path("REQ-0001.prk")
+        os.chmod(path, 0o640)
+
+        configuration = {
+            "format": "REQ-%N",
+            "input": io.StringIO("PRK-REQ REQ-0001\nNew text\n-- PRK-REQ\n"),
+            "output": io.StringIO(),
+            "output_root": self.root.name,
+            "storage": 0,
+            "width": 4,
+        }
+        prk.split(configuration)
+
+        with open(path, "rt") as requirement:
+            self.assertIn("New text", requirement.read())
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+    def test_prune_keeps_requirements_of_other_documents(self):
+        self.split("PRK-REQ REQ-0001\nOne\n-- PRK-REQ\n"
+                   "PRK-REQ REQ-0002\nTwo\n-- PRK-REQ\n"
+                   "PRK-REQ REQ-0003\nThree\n-- PRK-REQ\n")
+        self.write("B.prk", "PRK-INC REQ-0001\nPRK-INC REQ-0002\n")
+
+        configuration = {
+            "format": "REQ-%N",
+            "input": io.StringIO("PRK-REQ REQ-0001\nOne\n-- PRK-REQ\n"
+                                 "PRK-REQ REQ-0003\nThree\n-- PRK-REQ\n"
+                                 "PRK-MEM REQ-0002\n"),
+            "output": io.StringIO(),
+            "output_root": self.root.name,
+            "prune": True,
+            "storage": 1,
+            "width": 4,
+        }
+        prk.split(configuration)
+
+        self.assertEqual(sorted(os.listdir(self.root.name)),
+                         ["B.prk", "REQ-0001", "REQ-0001.prk", "REQ-0002.prk",
+                          "REQ-0003"])
+
+    def test_prune_removes_requirements_no_longer_cited(self):
+        self.split("PRK-REQ REQ-0001\nOne\n-- PRK-REQ\n"
+                   "PRK-REQ REQ-0002\nTwo\n-- PRK-REQ\n", storage=1)
+        self.split("PRK-REQ REQ-0002\nTwo\n-- PRK-REQ\n")
+
+        configuration = {
+            "format": "REQ-%N",
+            "input": io.StringIO("PRK-REQ REQ-0001\nOne\n-- PRK-REQ\n"
+                                 "PRK-MEM REQ-0002\n"),
+            "output": io.StringIO(),
+            "output_root": self.root.name,
+            "prune": True,
+            "storage": 0,
+            "width": 4,
+        }
+        prk.split(configuration)
+
+        self.assertEqual(configuration["output"].getvalue(),
+                         "PRK-INC REQ-0001\nPRK-MEM REQ-0002\n")
+        self.assertEqual(sorted(os.listdir(self.root.name)),
+                         ["REQ-0001.prk"])
+
+
+if __name__ == "__main__":
+    unittest.main()
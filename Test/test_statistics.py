@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import unittest
+
+import fixture
+import prk
+
+DOCUMENT = """Title
+=====
+
+PRK-INC REQ-0001
+PRK-LNK REQ-0001 UP-1
+
+PRK-INC REQ-0002
+
+PRK-MTX
+"""
+
+
+class TestStatistics(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.write("REQ-0001.prk", "First requirement\n")
+        self.write(os.path.join("REQ-0002", "text"), "Second requirement\n")
+
+        self.configuration = {
+            "input": io.StringIO(DOCUMENT),
+            "input_root": self.root.name,
+            "output": io.StringIO(),
+            "permissive": False,
+            "prefetch": 2,
+            "sparse": False,
+            "storage": 1,
+        }
+
+    def test_events(self):
+        events = list()
+
+        def hook(event, name, value):
+            events.append((event, name))
+
+        prk.add_hook(hook)
+        try:
+            prk.yield_cmd(self.configuration)
+        finally:
+            prk.remove_hook(hook)
+
+        self.assertIn(("start", "preprocess"), events)
+        self.assertIn(("end", "matrix"), events)
+        self.assertEqual(events[-1], ("end", "render"))
+        self.assertEqual(sorted(name for event, name in events
+                                if event == "requirement"),
+                         ["REQ-0001", "REQ-0002"])
+
+    def test_statistics(self):
+        statistics = prk.Statistics()
+        statistics.start()
+        try:
+            prk.yield_cmd(self.configuration)
+        finally:
+            statistics.stop()
+
+        self.assertEqual(statistics.requirements, 2)
+        self.assertEqual(statistics.files_read, 2)
+        self.assertEqual(statistics.bytes_read, 37)
+        self.assertEqual(statistics.phases["load"][0], 2)
+        self.assertGreater(statistics.peak_memory, 0)
+        self.assertEqual(prk._HOOKS, [])
+
+        output = io.StringIO()
+        statistics.report(output)
+        self.assertIn("Requirements: 2\n", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
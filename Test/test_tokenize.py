@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+import prk
+
+
+class TestTokenize(unittest.TestCase):
+
+    def test_kinds(self):
+        lines = [
+            "Title\n", "=====\n", "PRK-REQ REQ-0001  \n", "-- PRK-REQ\n",
+            "PRK-TAG prio high\n", "-- PRK-TAG\n", "PRK-LNK REQ-0001 UP-1\n",
+            "plain text\n"
+        ]
+        kinds = [token.kind for token in prk.tokenize(lines)]
+
+        self.assertEqual(kinds, [
+            prk.TOKEN_TXT, prk.TOKEN_HDG, prk.TAG_BRB, prk.TAG_ERB,
+            prk.TAG_BTB, prk.TAG_ETB, prk.TAG_LNK, prk.TOKEN_TXT
+        ])
+
+    def test_values(self):
+        tokens = list(prk.tokenize(["Title", "~~~~~~", "PRK-INC REQ-0001 "]))
+
+        self.assertEqual(tokens[1].value, ("~", "Title"))
+        self.assertEqual(tokens[2].value, " REQ-0001")
+        self.assertEqual(tokens[2].line_num, 3)
+
+    def test_first_line_is_not_underline(self):
+        tokens = list(prk.tokenize(["----", "----"]))
+
+        self.assertEqual(tokens[0].kind, prk.TOKEN_TXT)
+        self.assertEqual(tokens[1].kind, prk.TOKEN_HDG)
+
+    def test_replay_of_pipe(self):
+        text = "Title\r\n=====\nPRK-INC REQ-0001\n\udcff\n"
+
+        # Like a pipe, input can only be read once
+        pipe = io.StringIO(text, newline="")
+        pipe.seekable = lambda: False
+        replay = prk._replay_tokens(pipe)
+
+        expected = list(prk.tokenize(io.StringIO(text, newline="")))
+        self.assertEqual(list(replay()), expected)
+        self.assertEqual(list(replay()), expected)
+
+    def test_replay_of_large_pipe(self):
+        text = ("PRK-LNK REQ-0001 REQ-0002\r\n" + "word " * 40 +
+                "\udcff\n") * (1 << 13)
+
+        # Input larger than a chunk is copied in a spool file
+        pipe = io.StringIO(text, newline="")
+        pipe.seekable = lambda: False
+        replay = prk._replay_tokens(pipe)
+
+        expected = list(prk.tokenize(io.StringIO(text, newline="")))
+        self.assertEqual(list(replay()), expected)
+        self.assertEqual(list(replay()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
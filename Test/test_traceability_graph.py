@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import io
+import pickle
+import unittest
+
+import prk
+
+
+class TestTraceabilityGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = prk.TraceabilityGraph()
+        self.graph.add_link("REQ-0002", "UP-2")
+        self.graph.add_link("REQ-0001", "UP-2")
+        self.graph.add_link("REQ-0001", "UP-1")
+        self.graph.add_link("REQ-0001", "UP-1")
+        self.graph.set_derived("REQ-0003")
+        self.graph.add_requirement("REQ-0004")
+
+    def test_both_directions(self):
+        self.assertEqual(self.graph.requirements(),
+                         ["REQ-0001", "REQ-0002", "REQ-0003", "REQ-0004"])
+        self.assertEqual(self.graph.references("REQ-0001"), ["UP-1", "UP-2"])
+        self.assertEqual(self.graph.referenced_ids(), ["UP-1", "UP-2"])
+        self.assertEqual(self.graph.referrers("UP-2"),
+                         ["REQ-0001", "REQ-0002"])
+        self.assertEqual(self.graph.referrers("REQ-0001"), [])
+
+    def test_rows(self):
+        self.assertEqual(list(self.graph.rows()), [
+            ("REQ-0001", ["UP-1", "UP-2"]), ("REQ-0002", ["UP-2"]),
+            ("REQ-0003", []), ("REQ-0004", [])])
+        self.assertEqual(list(self.graph.rows(forward=False)), [
+            ("UP-1", ["REQ-0001"]), ("UP-2", ["REQ-0001", "REQ-0002"])])
+
+    def test_derived(self):
+        self.assertTrue(self.graph.is_derived("REQ-0003"))
+        self.assertFalse(self.graph.is_derived("REQ-0004"))
+        self.assertEqual(self.graph.references("REQ-0003"), [])
+
+    def test_links_added_after_query(self):
+        self.graph.references("REQ-0001")
+        self.graph.add_link("REQ-0000", "UP-3")
+
+        self.assertEqual(self.graph.referrers("UP-3"), ["REQ-0000"])
+        self.assertEqual(self.graph.references("REQ-0001"), ["UP-1", "UP-2"])
+
+    def test_line_numbers(self):
+        graph = prk.TraceabilityGraph()
+        graph.add_link("REQ-0001", "UP-1", 10)
+        graph.add_link("REQ-0001", "UP-1", 20)
+        graph.add_requirement("REQ-0002", 30)
+
+        self.assertEqual(graph.link_line("REQ-0001", "UP-1"), 10)
+        self.assertEqual(graph.line("REQ-0002"), 30)
+        self.assertIsNone(graph.link_line("REQ-0002", "UP-1"))
+        self.assertIsNone(self.graph.line("REQ-0001"))
+
+        # Links are renumbered when a new identifier comes before them
+        graph.add_link("REQ-0000", "UP-1", 40)
+        self.assertEqual(graph.link_line("REQ-0001", "UP-1"), 10)
+        self.assertEqual(graph.link_line("REQ-0000", "UP-1"), 40)
+        self.assertEqual(graph.line("UP-1"), 10)
+
+    def test_pickle(self):
+        graph = pickle.loads(pickle.dumps(self.graph))
+
+        self.assertEqual(graph, self.graph)
+        self.assertIn("REQ-0004", graph)
+        self.assertNotIn("UP-1", graph)
+
+    def test_empty(self):
+        graph = prk.preprocess(prk.tokenize(["Title", "====="]))[
+            "traceability"]
+
+        self.assertEqual(graph.requirements(), [])
+        self.assertEqual(graph.referrers("UP-1"), [])
+        self.assertTrue(graph.index())
+        self.assertEqual(graph.cycles(), [])
+        self.assertEqual(graph, prk.TraceabilityGraph())
+        self.assertEqual(pickle.loads(pickle.dumps(graph)), graph)
+
+    def test_cross(self):
+        document = io.StringIO("PRK-LNK REQ-0002 UP-1\n"
+                               "PRK-LNK REQ-0001 UP-1\n"
+                               "PRK-DLN REQ-0003\n")
+        output = io.StringIO()
+        prk.cross({"input": document, "output": output})
+
+        self.assertEqual(output.getvalue(),
+                         "UP-1 REQ-0001\nUP-1 REQ-0002\n")
+
+
+class TestImpact(unittest.TestCase):
+
+    def setUp(self):
+        self.document = io.StringIO("PRK-LNK REQ-0003 REQ-0002\n"
+                                    "PRK-LNK REQ-0002 REQ-0001\n"
+                                    "PRK-LNK REQ-0001 UP-1\n"
+                                    "PRK-LNK REQ-0005 REQ-0006\n"
+                                    "PRK-LNK REQ-0006 REQ-0005\n"
+                                    "PRK-LNK REQ-0007 REQ-0007\n")
+
+    def impact(self, req_ids, depends=False):
+        self.document.seek(0)
+        output = io.StringIO()
+        prk.impact({"depends": depends, "ids": req_ids,
+                    "input": self.document, "output": output})
+
+        return output.getvalue().split()
+
+    def test_transitive(self):
+        self.assertEqual(self.impact(["UP-1"]),
+                         ["REQ-0001", "REQ-0002", "REQ-0003"])
+        self.assertEqual(self.impact(["REQ-0002"], depends=True),
+                         ["REQ-0001", "UP-1"])
+
+    def test_cycles(self):
+        graph = prk.preprocess(prk.tokenize(self.document))["traceability"]
+
+        self.assertTrue(graph.index())
+        self.assertFalse(graph.index())
+        self.assertEqual(graph.cycles(),
+                         [["REQ-0005", "REQ-0006"], ["REQ-0007"]])
+
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(self.impact(["REQ-0005"]), ["REQ-0006"])
+
+    def test_empty_document(self):
+        self.document = io.StringIO("Title\n=====\n")
+
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(self.impact(["REQ-0001"]), [])
+
+    def test_reachable_after_link(self):
+        graph = prk.preprocess(prk.tokenize(self.document))["traceability"]
+
+        for i in range(2):
+            self.assertEqual(graph.reachable(["REQ-0001"], forward=False),
+                             ["REQ-0002", "REQ-0003"])
+            self.assertEqual(graph.reachable(["REQ-0003", "REQ-0005"]),
+                             ["REQ-0001", "REQ-0002", "REQ-0006", "UP-1"])
+
+        graph.add_link("REQ-0004", "REQ-0003")
+        self.assertEqual(graph.reachable(["REQ-0001"], forward=False),
+                         ["REQ-0002", "REQ-0003", "REQ-0004"])
+
+
+if __name__ == "__main__":
+    unittest.main()
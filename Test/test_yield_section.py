@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+import fixture
+import prk
+
+DOCUMENT = """Title
+=====
+
+First chapter
+-------------
+
+PRK-INC REQ-0001
+PRK-LNK REQ-0001 UP-1
+
+Second chapter
+--------------
+
+PRK-INC REQ-0002
+PRK-LNK REQ-0002 UP-2
+
+Detail
+~~~~~~
+
+PRK-INC REQ-0003
+PRK-DLN REQ-0003
+
+PRK-MTX
+"""
+
+
+class TestYieldSection(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # Requirements of first chapter are not stored at all
+        for req_id in ["REQ-0002", "REQ-0003"]:
+            self.write(req_id + ".prk", "Text of {}\n".format(req_id))
+
+    def yield_cmd(self, **selection):
+        configuration = {
+            "input": io.StringIO(DOCUMENT),
+            "input_root": self.root.name,
+            "output": io.StringIO(),
+            "permissive": False,
+            "prefetch": 2,
+            "sparse": False,
+            "storage": 1,
+        }
+        configuration.update(selection)
+        prk.yield_cmd(configuration)
+
+        return configuration["output"].getvalue()
+
+    def test_sections(self):
+        sections = prk.preprocess(prk.tokenize(io.StringIO(DOCUMENT)))[
+            "sections"]
+
+        self.assertEqual([(s.title, s.first_line, s.last_line)
+                          for s in sections],
+                         [("Title", 1, 22), ("First chapter", 4, 9),
+                          ("Second chapter", 10, 22), ("Detail", 16, 22)])
+        self.assertEqual(sections[2][4:], (1, 3))
+
+    def test_section(self):
+        output = self.yield_cmd(section="Second chapter")
+
+        self.assertTrue(output.startswith("Second chapter\n---"))
+        self.assertIn("Text of REQ-0003", output)
+        self.assertIn("| REQ-0002_ ", output)
+        self.assertIn("Derived requirement", output)
+        self.assertNotIn("REQ-0001", output)
+
+    def test_lines(self):
+        output = self.yield_cmd(lines=(13, 14))
+
+        self.assertEqual(output.count("Text of REQ-0002"), 1)
+        self.assertNotIn("Detail", output)
+
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(self.yield_cmd(section="Unknown"), "")
+
+    def test_lines_to_end(self):
+        output = self.yield_cmd(lines=(10, None))
+
+        self.assertTrue(output.startswith("Second chapter\n---"))
+        self.assertIn("Detail\n~~~", output)
+        self.assertIn("Text of REQ-0003", output)
+        self.assertNotIn("REQ-0001", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import gzip
+import io
+import unittest
+
+import fixture
+import prk
+
+DOCUMENT = """Title
+=====
+
+PRK-TOC
+
+PRK-INC REQ-0001
+PRK-LNK REQ-0001 UP-1
+
+PRK-INC REQ-0002
+PRK-LNK REQ-0002 UP-2
+
+PRK-MTX
+"""
+
+
+class TestYieldWatch(fixture.DirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # As in watch mode, requirements are read again only when changed
+        prk._SHARED_REQUIREMENTS = dict()
+        self.addCleanup(setattr, prk, "_SHARED_REQUIREMENTS", None)
+
+        self.input_path = self.path("doc.prk")
+        self.output_path = self.path("doc.rst")
+
+        self.write("doc.prk", DOCUMENT)
+        self.write("REQ-0001.prk", "First requirement\n")
+        self.write("REQ-0002.prk", "Second requirement\n")
+
+        self.configuration = {
+            "input_root": self.root.name,
+            "permissive": False,
+            "prefetch": 2,
+            "sparse": False,
+            "storage": 1,
+        }
+        with open(self.input_path, "rt") as input_file, \
+                open(self.output_path, "wt") as output_file:
+            configuration = dict(self.configuration)
+            configuration["input"] = input_file
+            configuration["output"] = output_file
+            self.watcher = prk._YieldWatcher(configuration)
+
+    def expected(self):
+        with open(self.input_path, "rt") as input_file:
+            configuration = dict(self.configuration)
+            configuration["input"] = input_file
+            configuration["output"] = io.StringIO()
+            prk.yield_cmd(configuration)
+        return configuration["output"].getvalue()
+
+    def output(self):
+        with open(self.output_path, "rt") as input_file:
+            return input_file.read()
+
+    def test_requirement_change(self):
+        self.assertTrue(self.watcher.refresh())
+        self.assertEqual(self.output(), self.expected())
+        self.assertFalse(self.watcher.refresh())
+
+        self.write("REQ-0002.prk", "Second requirement, amended\n")
+        self.assertTrue(self.watcher.refresh())
+        self.assertIn("amended", self.output())
+        self.assertEqual(self.output(), self.expected())
+
+    def test_document_change(self):
+        self.watcher.refresh()
+
+        self.write("doc.prk", DOCUMENT.replace("UP-2", "UP-3") +
+                   "\nChapter\n-------\n")
+        self.assertTrue(self.watcher.refresh())
+        self.assertIn("UP-3", self.output())
+        self.assertIn("`Chapter`_", self.output())
+        self.assertEqual(self.output(), self.expected())
+
+    def test_compressed_output(self):
+        with open(self.input_path, "rt") as input_file:
+            configuration = dict(self.configuration)
+            configuration["input"] = input_file
+            configuration["output"] = prk.OutputSink(self.output_path + ".gz")
+            configuration["output"].discard()
+            watcher = prk._YieldWatcher(configuration)
+
+        self.assertTrue(watcher.refresh())
+        with gzip.open(self.output_path + ".gz", "rt") as input_file:
+            self.assertEqual(input_file.read(), self.expected())
+
+
+if __name__ == "__main__":
+    unittest.main()